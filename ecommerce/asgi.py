@@ -16,8 +16,13 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
 
 _django_asgi_app = get_asgi_application()
 
+from django.conf import settings
 from store.routing import websocket_urlpatterns
 
+if settings.STORE_WARMUP_ON_START:
+	from store.warmup import warmup
+	warmup()
+
 application = ProtocolTypeRouter({
 	"http": _django_asgi_app,
 	"websocket": AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
@@ -131,8 +131,21 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-# Whitenoise for static files
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Uploads get content-hashed names (see store.media) so they can be cached as
+# immutable; Whitenoise serves static files.
+STORAGES = {
+    'default': {'BACKEND': 'store.media.HashedMediaStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
+
+# How MEDIA_URL is served (see store.media): 'django' sends files from Python,
+# 'x-accel' / 'x-sendfile' hand them to nginx / Apache via a response header,
+# 'off' leaves MEDIA_URL entirely to the front server.
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')
+# nginx location (marked `internal`) aliased to MEDIA_ROOT, for 'x-accel'.
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Browser cache lifetime for media without a content hash in the name.
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', '3600'))
 
 # Auth redirects
 LOGIN_REDIRECT_URL = 'home'
@@ -141,6 +154,50 @@ LOGOUT_REDIRECT_URL = 'home'
 # Session cart settings
 CART_SESSION_ID = 'cart'
 
+# Cache. Set REDIS_URL to share it (and the rate-limit buckets) between workers;
+# the local-memory fallback is per process.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Token-bucket rate limits per route (see store.ratelimit). Each scope is keyed
+# by client IP, session or user; "N/m" allows bursts of N, refilled over a minute.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+# request.META key holding the client IP, e.g. 'HTTP_X_REAL_IP' behind a proxy.
+RATE_LIMIT_IP_META = os.getenv('RATE_LIMIT_IP_META', 'REMOTE_ADDR')
+RATE_LIMITS = {
+    'add_to_cart': {'ip': '120/m', 'session': '60/m', 'user': '60/m'},
+    'update_cart_item': {'ip': '120/m', 'session': '60/m', 'user': '60/m'},
+    'checkout': {'ip': '30/m', 'user': '10/m'},
+    'chat': {'ip': '60/m', 'session': '30/m', 'user': '30/m'},
+}
+
+# Sales rollups only fold orders at least this many seconds old, so an order
+# whose checkout commits after a newer one is not skipped (see store.analytics).
+SALES_ROLLUP_LAG = int(os.getenv('SALES_ROLLUP_LAG', '120'))
+
+# Seconds before a worker reloads its catalog snapshot even if the version in the
+# cache did not move (only needed when workers do not share a cache, see REDIS_URL).
+CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', '300'))
+
+# Rows each product's stock is split across (see store.inventory). More shards
+# let more concurrent buyers of one product proceed without waiting on a row lock.
+INVENTORY_SHARDS = int(os.getenv('INVENTORY_SHARDS', '8'))
+
+# Seconds before a worker rebuilds its typeahead index to pick up catalog
+# changes saved by other workers (its own saves apply immediately).
+TYPEAHEAD_MAX_AGE = int(os.getenv('TYPEAHEAD_MAX_AGE', '300'))
+
 # Channels layer (dev: in-memory)
 CHANNEL_LAYERS = {
     'default': {
@@ -148,6 +205,14 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Serve the catalog views (home, category, product, chat API) with their async
+# implementations. Enable when running under an ASGI server such as Daphne;
+# under WSGI every async view would pay for its own event loop.
+STORE_ASYNC_VIEWS = os.getenv('STORE_ASYNC_VIEWS', '') == '1'
+
+# Run store.warmup when the WSGI/ASGI application is created.
+STORE_WARMUP_ON_START = os.getenv('STORE_WARMUP_ON_START', '') == '1'
+
 # Stripe (optional)
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
@@ -0,0 +1,42 @@
+"""
+Production settings for ecommerce project.
+
+Select with ``DJANGO_SETTINGS_MODULE=ecommerce.settings_production``. Everything
+not overridden here comes from ``ecommerce.settings``.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import TEMPLATES
+
+SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+	raise ImproperlyConfigured('Set DJANGO_SECRET_KEY; the production profile has no default secret key.')
+
+DEBUG = False
+
+ALLOWED_HOSTS = [h for h in os.getenv('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',') if h]
+
+# Templates are parsed once per process and kept in memory; there is no
+# per-render stat of the template files. APP_DIRS must be off when loaders is set.
+TEMPLATES = [{
+	**TEMPLATES[0],
+	'APP_DIRS': False,
+	'OPTIONS': {
+		**TEMPLATES[0]['OPTIONS'],
+		'debug': False,
+		'loaders': [
+			('django.template.loaders.cached.Loader', [
+				'django.template.loaders.filesystem.Loader',
+				'django.template.loaders.app_directories.Loader',
+			]),
+		],
+	},
+}]
+
+# Warm templates, URL patterns and the DB connection when a worker boots
+# (see store.warmup), so the first real request does not pay for them.
+STORE_WARMUP_ON_START = os.getenv('STORE_WARMUP_ON_START', '1') == '1'
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.STORE_WARMUP_ON_START:
+	from store.warmup import warmup
+	warmup()
@@ -0,0 +1,74 @@
+(function(){
+	// Progressive enhancement: without JS the cart forms post and redirect as usual.
+	const countEl = document.getElementById('cart-count');
+	const totalEl = document.getElementById('cart-total');
+
+	function csrfToken(){
+		return (document.cookie.match(/csrftoken=([^;]+)/)||[])[1];
+	}
+
+	async function post(url, body, json){
+		const headers = {'X-CSRFToken': csrfToken()};
+		if(json) headers['Content-Type'] = 'application/json';
+		const res = await fetch(url, { method: 'POST', headers: headers, body: body, credentials: 'same-origin' });
+		if(!res.ok) throw new Error('Cart update failed (' + res.status + ')');
+		return res.json();
+	}
+
+	function applyCart(data){
+		if(countEl) countEl.textContent = data.cart.count;
+		if(totalEl) totalEl.textContent = data.cart.total;
+		data.lines.forEach(function(line){
+			const row = document.querySelector('.cart-row[data-item-id="' + line.id + '"]');
+			if(!row) return;
+			const input = row.querySelector('input[name="quantity"]');
+			input.value = line.quantity;
+			input.dataset.quantity = line.quantity;
+			row.querySelector('.cart-subtotal').textContent = '$' + line.subtotal;
+		});
+		data.removed.forEach(function(id){
+			const row = document.querySelector('.cart-row[data-item-id="' + id + '"]');
+			if(row) row.remove();
+		});
+		const checkout = document.getElementById('checkout-submit');
+		if(checkout) checkout.disabled = data.cart.count === 0;
+	}
+
+	// Product page: add to cart without leaving the page.
+	document.querySelectorAll('form.add-cart-form[data-api]').forEach(function(form){
+		form.addEventListener('submit', async function(e){
+			e.preventDefault();
+			const button = form.querySelector('button[type="submit"]');
+			try{
+				applyCart(await post(form.dataset.api, new FormData(form)));
+				if(button){
+					const label = button.textContent;
+					button.textContent = 'Added!';
+					setTimeout(function(){ button.textContent = label; }, 1200);
+				}
+			}catch(err){
+				form.submit();
+			}
+		});
+	});
+
+	// Cart page: send every changed quantity in one batch request.
+	document.querySelectorAll('form.cart-qty-form').forEach(function(form){
+		form.addEventListener('submit', async function(e){
+			e.preventDefault();
+			const lines = [];
+			document.querySelectorAll('form.cart-qty-form').forEach(function(f){
+				const input = f.querySelector('input[name="quantity"]');
+				if(input.value !== input.dataset.quantity){
+					lines.push({id: Number(f.dataset.itemId), quantity: Math.max(0, parseInt(input.value, 10) || 0)});
+				}
+			});
+			if(!lines.length) return;
+			try{
+				applyCart(await post('/api/cart/batch/', JSON.stringify({lines: lines}), true));
+			}catch(err){
+				form.submit();
+			}
+		});
+	});
+})();
@@ -21,7 +21,10 @@
 			ws.onmessage = (e) => {
 				try{ const data = JSON.parse(e.data); addMessage(data.message || '', 'bot'); }catch{}
 			};
-			ws.onclose = () => { ws = null; };
+			ws.onclose = (e) => {
+				ws = null;
+				if(e.code === 4429) addMessage('You are sending messages too quickly. Please wait a moment.');
+			};
 		}catch(err){ ws = null; }
 	}
 	connectWS();
@@ -40,6 +43,10 @@
 			form.append('message', text);
 			const csrf = (document.cookie.match(/csrftoken=([^;]+)/)||[])[1];
 			const res = await fetch('/api/chat/', { method: 'POST', headers: {'X-CSRFToken': csrf}, body: form });
+			if(res.status === 429){
+				addMessage('You are sending messages too quickly. Please wait a moment.');
+				return;
+			}
 			const data = await res.json();
 			addMessage(data.reply || 'Sorry, I had trouble responding.');
 		}catch(err){
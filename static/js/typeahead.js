@@ -0,0 +1,58 @@
+(function(){
+	const input = document.getElementById('search-input');
+	const list = document.getElementById('typeahead-results');
+	if(!input || !list) return;
+
+	let active = -1;
+	let latest = 0;
+
+	function render(results){
+		list.innerHTML = '';
+		active = -1;
+		results.forEach(function(r){
+			const li = document.createElement('li');
+			const a = document.createElement('a');
+			a.href = r.url;
+			a.textContent = r.label;
+			const kind = document.createElement('span');
+			kind.className = 'kind';
+			kind.textContent = r.type;
+			a.appendChild(kind);
+			li.appendChild(a);
+			list.appendChild(li);
+		});
+		list.hidden = results.length === 0;
+	}
+
+	input.addEventListener('input', async function(){
+		const q = input.value.trim();
+		const seq = ++latest;
+		if(!q){ render([]); return; }
+		try{
+			const res = await fetch('/api/typeahead/?q=' + encodeURIComponent(q));
+			const data = await res.json();
+			// Drop responses that arrive after a newer keystroke's.
+			if(seq === latest) render(data.results || []);
+		}catch(err){ render([]); }
+	});
+
+	input.addEventListener('keydown', function(e){
+		const links = list.querySelectorAll('a');
+		if(list.hidden || !links.length) return;
+		if(e.key === 'ArrowDown' || e.key === 'ArrowUp'){
+			e.preventDefault();
+			if(active >= 0) links[active].classList.remove('active');
+			active = (active + (e.key === 'ArrowDown' ? 1 : -1) + links.length) % links.length;
+			links[active].classList.add('active');
+		}else if(e.key === 'Enter' && active >= 0){
+			e.preventDefault();
+			window.location = links[active].href;
+		}else if(e.key === 'Escape'){
+			render([]);
+		}
+	});
+
+	document.addEventListener('click', function(e){
+		if(!list.contains(e.target) && e.target !== input) list.hidden = true;
+	});
+})();
@@ -12,17 +12,41 @@
 		messagesEl.scrollTop = messagesEl.scrollHeight;
 	}
 
+	let ws = null;
+	function connectWS(){
+		try{
+			const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+			ws = new WebSocket(`${scheme}://${location.host}/ws/chat/`);
+			ws.onopen = () => addMessage('Connected. Ask me about products!', 'bot');
+			ws.onmessage = (e) => {
+				try{ const data = JSON.parse(e.data); addMessage(data.message || '', 'bot'); }catch{}
+			};
+			ws.onclose = (e) => {
+				ws = null;
+				if(e.code === 4429) addMessage('You are sending messages too quickly. Please wait a moment.');
+			};
+		}catch(err){ ws = null; }
+	}
+	connectWS();
+
 	async function send(){
 		const text = inputEl.value.trim();
 		if(!text) return;
 		addMessage(text, 'user');
 		inputEl.value = '';
+		if(ws && ws.readyState === WebSocket.OPEN){
+			ws.send(JSON.stringify({message: text}));
+			return;
+		}
 		try{
 			const form = new FormData();
 			form.append('message', text);
-			// CSRF token read from cookie
 			const csrf = (document.cookie.match(/csrftoken=([^;]+)/)||[])[1];
 			const res = await fetch('/api/chat/', { method: 'POST', headers: {'X-CSRFToken': csrf}, body: form });
+			if(res.status === 429){
+				addMessage('You are sending messages too quickly. Please wait a moment.');
+				return;
+			}
 			const data = await res.json();
 			addMessage(data.reply || 'Sorry, I had trouble responding.');
 		}catch(err){
@@ -1,5 +1,16 @@
-from django.contrib import admin
-from .models import Category, Product, ProductImage, Cart, CartItem, Order, OrderItem
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import inventory
+from .models import (
+	Category, Product, ProductImage, Cart, CartItem, Order, OrderItem, ProductRecommendation,
+	SalesRollup, ProductSalesRollup, CategorySalesRollup,
+)
 
 
 @admin.register(Category)
@@ -15,14 +26,53 @@ class ProductImageInline(admin.TabularInline):
 	extra = 1
 
 
+class ProductAdminForm(forms.ModelForm):
+	# An adjustment rather than a total: sales made while the form is open stay sold.
+	stock_change = forms.IntegerField(
+		required=False, initial=0, label="Add or remove stock",
+		help_text="Units to add (positive) or remove (negative) when saving.",
+	)
+
+	class Meta:
+		model = Product
+		fields = "__all__"
+
+	def clean_stock_change(self):
+		change = self.cleaned_data["stock_change"] or 0
+		if change < 0 and (not self.instance.pk or -change > self.instance.available):
+			raise forms.ValidationError("Cannot remove more units than are in stock.")
+		return change
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-	list_display = ("title", "category", "price", "discount_percent", "stock", "is_active")
+	form = ProductAdminForm
+	list_display = ("title", "category", "price", "discount_percent", "available", "is_active")
 	list_filter = ("category", "is_active")
 	search_fields = ("title", "description")
 	prepopulated_fields = {"slug": ("title",)}
+	readonly_fields = ("available",)
 	inlines = [ProductImageInline]
 
+	def get_queryset(self, request):
+		return inventory.with_available(super().get_queryset(request))
+
+	@admin.display(description="Stock", ordering="available")
+	def available(self, obj):
+		return obj.available if obj.pk else 0
+
+	def save_model(self, request, obj, form, change):
+		super().save_model(request, obj, form, change)
+		units = form.cleaned_data.get("stock_change") or 0
+		if units > 0:
+			inventory.add_stock(obj.pk, units)
+		elif units < 0:
+			try:
+				with transaction.atomic():
+					inventory.take(obj.pk, -units)
+			except inventory.OutOfStock as exc:
+				self.message_user(request, f"Stock not changed: {exc}", messages.ERROR)
+
 
 class CartItemInline(admin.TabularInline):
 	model = CartItem
@@ -47,3 +97,49 @@ class OrderAdmin(admin.ModelAdmin):
 	list_filter = ("status", "created_at")
 	search_fields = ("id", "user__username", "email")
 	inlines = [OrderItemInline]
+
+
+@admin.register(ProductRecommendation)
+class ProductRecommendationAdmin(admin.ModelAdmin):
+	list_display = ("product", "rank", "recommended", "score")
+	list_select_related = ("product", "recommended")
+	search_fields = ("product__title",)
+
+
+@admin.register(ProductSalesRollup)
+class ProductSalesRollupAdmin(admin.ModelAdmin):
+	list_display = ("bucket", "period", "product", "revenue", "units", "orders")
+	list_filter = ("period",)
+	list_select_related = ("product",)
+	search_fields = ("product__title",)
+	date_hierarchy = "bucket"
+
+
+@admin.register(CategorySalesRollup)
+class CategorySalesRollupAdmin(admin.ModelAdmin):
+	"""Sales dashboard. Reads only the rollup tables, never raw orders."""
+	list_display = ("bucket", "period", "category", "revenue", "units", "orders")
+	list_filter = ("period", "category")
+	list_select_related = ("category",)
+	date_hierarchy = "bucket"
+	change_list_template = "admin/store/sales_dashboard.html"
+	dashboard_days = 30
+
+	def changelist_view(self, request, extra_context=None):
+		since = timezone.now() - timedelta(days=self.dashboard_days)
+		daily_categories = CategorySalesRollup.objects.filter(period=SalesRollup.DAY, bucket__gte=since)
+		daily_products = ProductSalesRollup.objects.filter(period=SalesRollup.DAY, bucket__gte=since)
+		extra_context = {
+			**(extra_context or {}),
+			'dashboard_days': self.dashboard_days,
+			'daily_totals': daily_categories.values('bucket')
+				.annotate(revenue=Sum('revenue'), units=Sum('units'))
+				.order_by('-bucket'),
+			'category_totals': daily_categories.values('category__name')
+				.annotate(revenue=Sum('revenue'), units=Sum('units'), orders=Sum('orders'))
+				.order_by('-revenue'),
+			'top_products': daily_products.values('product__title')
+				.annotate(revenue=Sum('revenue'), units=Sum('units'))
+				.order_by('-revenue')[:10],
+		}
+		return super().changelist_view(request, extra_context=extra_context)
@@ -0,0 +1,124 @@
+"""Incremental hourly/daily sales rollups per product and per category.
+
+Orders are folded in by id behind a ``JobWatermark``, one chunk per
+transaction, so a run can be interrupted and resumed.
+
+Ids are handed out at INSERT, not at commit, so a lower id can commit after
+a higher one. A run therefore only folds orders created at least
+``SALES_ROLLUP_LAG`` seconds ago; checkout transactions must finish well
+within that, or a late order falls behind the watermark and only
+``backfill_sales_rollups`` counts it.
+
+Orders count as sold if they are not cancelled when folded in. A cancellation
+after that is only reflected once ``backfill_sales_rollups`` rebuilds the
+rollups.
+"""
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import CategorySalesRollup, JobWatermark, Order, OrderItem, ProductSalesRollup, SalesRollup
+
+WATERMARK_NAME = 'sales_rollups'
+CHUNK_SIZE = 1000
+
+
+def settled_until() -> int:
+	"""Highest order id created more than ``SALES_ROLLUP_LAG`` seconds ago."""
+	cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'SALES_ROLLUP_LAG', 120))
+	return Order.objects.filter(created_at__lte=cutoff).aggregate(last=Max('id'))['last'] or 0
+
+
+def _buckets(created_at):
+	hour = created_at.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+	return ((SalesRollup.HOUR, hour), (SalesRollup.DAY, hour.replace(hour=0)))
+
+
+def summarize(since: int, until: int):
+	"""Aggregate lines of orders with id in (since, until] into per-product and per-category deltas.
+
+	Each delta maps ``(period, bucket, id)`` to ``[revenue, units, order_ids]``.
+	"""
+	products = defaultdict(lambda: [Decimal(0), 0, set()])
+	categories = defaultdict(lambda: [Decimal(0), 0, set()])
+	lines = (
+		OrderItem.objects.filter(order_id__gt=since, order_id__lte=until)
+		.exclude(order__status=Order.CANCELLED)
+		.values_list('order_id', 'order__created_at', 'product_id', 'product__category_id', 'unit_price', 'quantity')
+		.iterator(chunk_size=2000)
+	)
+	for order_id, created_at, product_id, category_id, unit_price, quantity in lines:
+		revenue = unit_price * quantity
+		for period, bucket in _buckets(created_at):
+			for totals in (products[(period, bucket, product_id)], categories[(period, bucket, category_id)]):
+				totals[0] += revenue
+				totals[1] += quantity
+				totals[2].add(order_id)
+	return products, categories
+
+
+def _merge(model, field: str, deltas):
+	"""Add ``deltas`` onto existing rollup rows, creating the missing ones."""
+	if not deltas:
+		return
+	periods = {period for period, _, _ in deltas}
+	buckets = {bucket for _, bucket, _ in deltas}
+	ids = {obj_id for _, _, obj_id in deltas}
+	existing = {
+		(row.period, row.bucket, getattr(row, field)): row
+		for row in model.objects.filter(period__in=periods, bucket__in=buckets, **{f'{field}__in': ids})
+	}
+	to_update, to_create = [], []
+	for key, (revenue, units, orders) in deltas.items():
+		row = existing.get(key)
+		if row is None:
+			period, bucket, obj_id = key
+			to_create.append(model(
+				period=period, bucket=bucket, revenue=revenue, units=units, orders=len(orders), **{field: obj_id}
+			))
+		else:
+			row.revenue += revenue
+			row.units += units
+			row.orders += len(orders)
+			to_update.append(row)
+	model.objects.bulk_create(to_create, batch_size=500)
+	model.objects.bulk_update(to_update, ['revenue', 'units', 'orders'], batch_size=500)
+
+
+def update_rollups(reset: bool = False, chunk_size: int = CHUNK_SIZE, progress=None) -> tuple:
+	"""Fold every settled order (see ``settled_until``) placed since the watermark into the rollups.
+
+	Returns the ``(since, until)`` order id range that was covered.
+
+	With ``reset=True`` the rollups are cleared and rebuilt from the first order.
+	"""
+	with transaction.atomic():
+		watermark, _ = JobWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+		if reset:
+			ProductSalesRollup.objects.all().delete()
+			CategorySalesRollup.objects.all().delete()
+			watermark.last_id = 0
+			watermark.save(update_fields=['last_id', 'updated_at'])
+		start = watermark.last_id
+	until = settled_until()
+	while True:
+		with transaction.atomic():
+			# Re-read under lock for every chunk: an overlapping run may have folded orders meanwhile.
+			watermark = JobWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+			since = watermark.last_id
+			if since >= until:
+				break
+			upper = min(since + chunk_size, until)
+			products, categories = summarize(since, upper)
+			_merge(ProductSalesRollup, 'product_id', products)
+			_merge(CategorySalesRollup, 'category_id', categories)
+			watermark.last_id = upper
+			watermark.save(update_fields=['last_id', 'updated_at'])
+		if progress:
+			progress(upper, until)
+	return start, max(start, until)
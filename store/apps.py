@@ -5,3 +5,6 @@ class StoreConfig(AppConfig):
 	default_auto_field = 'django.db.models.BigAutoField'
 	name = 'store'
 	verbose_name = 'Online Store'
+
+	def ready(self):
+		from . import signals  # noqa: F401
@@ -0,0 +1,138 @@
+"""Per-worker read model of the active catalog for listings, the page header and chat.
+
+Products and categories are loaded once into immutable ``__slots__`` records
+holding only what those paths render (no description, no model state, price
+after discount computed up front) and indexed by id, slug and category. The
+whole snapshot is replaced in one reference swap when the catalog version in
+the default cache changes; ``store.signals`` bumps it on every Product or
+Category save and delete. Set ``REDIS_URL`` so all workers see the same version.
+Otherwise each worker also reloads after ``CATALOG_MAX_AGE`` seconds.
+Stock is not part of the snapshot (it changes with every sale); read it from
+``store.inventory``.
+"""
+import random
+import sys
+import threading
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .models import Category, Product, discounted_price
+
+VERSION_KEY = 'catalog:version'
+
+
+class CategoryRecord:
+	__slots__ = ('id', 'name', 'slug', 'is_active')
+
+	def __init__(self, id, name, slug, is_active):
+		self.id = id
+		self.name = name
+		self.slug = slug
+		self.is_active = is_active
+
+
+class ProductRecord:
+	__slots__ = ('id', 'slug', 'title', 'price', 'discount_percent', 'discounted_price', 'thumbnail_url', 'category')
+
+	def __init__(self, id, slug, title, price, discount_percent, thumbnail, category):
+		self.id = id
+		self.slug = slug
+		self.title = title
+		self.price = price
+		self.discount_percent = discount_percent
+		self.discounted_price = discounted_price(price, discount_percent)
+		self.thumbnail_url = default_storage.url(thumbnail) if thumbnail else ''
+		self.category = category
+
+	@property
+	def pk(self):
+		return self.id
+
+
+class CatalogSnapshot:
+	def __init__(self, version, categories, products):
+		self.version = version
+		self.loaded_at = monotonic()
+		self.categories = tuple(c for c in categories if c.is_active)
+		self.category_by_slug = {c.slug: c for c in self.categories}
+		self.products = tuple(products)
+		self.product_by_id = {p.id: p for p in self.products}
+		by_category = {}
+		for product in self.products:
+			by_category.setdefault(product.category.id, []).append(product)
+		self.products_by_category = {cid: tuple(items) for cid, items in by_category.items()}
+
+	@classmethod
+	def load(cls, version):
+		categories = {
+			pk: CategoryRecord(pk, name, slug, is_active)
+			for pk, name, slug, is_active in Category.objects.order_by('id').values_list('id', 'name', 'slug', 'is_active')
+		}
+		rows = Product.objects.filter(is_active=True).values_list(
+			'id', 'slug', 'title', 'price', 'discount_percent', 'thumbnail', 'category_id',
+		)
+		products = [
+			ProductRecord(pk, slug, title, price, discount, thumbnail, categories[category_id])
+			for pk, slug, title, price, discount, thumbnail, category_id in rows
+		]
+		return cls(version, categories.values(), products)
+
+	def records(self, product_ids) -> list:
+		"""Records for ``product_ids`` in that order, skipping products not in the snapshot."""
+		return [self.product_by_id[pk] for pk in product_ids if pk in self.product_by_id]
+
+	def memory_report(self) -> dict:
+		"""Approximate bytes held: records, their strings and prices, and the indexes."""
+		record_bytes = sum(
+			sys.getsizeof(p) + sys.getsizeof(p.slug) + sys.getsizeof(p.title) + sys.getsizeof(p.price)
+			+ (sys.getsizeof(p.discounted_price) if p.discounted_price is not p.price else 0) + sys.getsizeof(p.thumbnail_url)
+			for p in self.products
+		) + sum(sys.getsizeof(c) + sys.getsizeof(c.name) + sys.getsizeof(c.slug) for c in self.categories)
+		index_bytes = (
+			sys.getsizeof(self.products) + sys.getsizeof(self.product_by_id) + sys.getsizeof(self.category_by_slug)
+			+ sys.getsizeof(self.products_by_category) + sum(sys.getsizeof(t) for t in self.products_by_category.values())
+		)
+		return {
+			'products': len(self.products),
+			'categories': len(self.categories),
+			'record_bytes': record_bytes,
+			'index_bytes': index_bytes,
+			'total_bytes': record_bytes + index_bytes,
+		}
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def current_version():
+	version = cache.get(VERSION_KEY)
+	if version is None:
+		# A random start, so a version lost from the cache never matches an old snapshot.
+		cache.add(VERSION_KEY, random.getrandbits(48), timeout=None)
+		version = cache.get(VERSION_KEY)
+	return version
+
+
+def bump_version():
+	try:
+		cache.incr(VERSION_KEY)
+	except ValueError:
+		current_version()
+
+
+def snapshot() -> CatalogSnapshot:
+	"""The worker's snapshot, reloaded first if the catalog version moved or it is too old."""
+	global _snapshot
+	version = current_version()
+	max_age = getattr(settings, 'CATALOG_MAX_AGE', 300)
+	snap = _snapshot
+	if snap is None or snap.version != version or monotonic() - snap.loaded_at > max_age:
+		with _lock:
+			snap = _snapshot
+			if snap is None or snap.version != version or monotonic() - snap.loaded_at > max_age:
+				snap = _snapshot = CatalogSnapshot.load(version)
+	return snap
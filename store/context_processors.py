@@ -1,7 +1,13 @@
-from .models import Category, Cart
+from asgiref.sync import sync_to_async
+
+from . import catalog
+from .models import CartItem
 
 def global_context(request):
-	categories = Category.objects.filter(is_active=True)[:20]
+	# Async views resolve this ahead of time (see aglobal_context) so render() does no ORM work.
+	if hasattr(request, '_global_context'):
+		return request._global_context
+	categories = catalog.snapshot().categories[:20]
 	cart_count = 0
 	try:
 		from .views import _get_or_create_cart
@@ -12,4 +18,27 @@ def global_context(request):
 	return {
 		'global_categories': categories,
 		'cart_count': cart_count,
-	}
\ No newline at end of file
+	}
+
+
+async def aglobal_context(request):
+	"""Async counterpart of global_context, for async views.
+
+	Resolves ``request.user`` and the header data with async queries and stores the
+	result on the request, where global_context picks it up during render(). Unlike the
+	sync version it never creates a cart or session just to show a zero badge.
+	"""
+	request.user = await request.auser()
+	categories = (await sync_to_async(catalog.snapshot)()).categories[:20]
+	cart_items = CartItem.objects.filter(cart__checked_out=False)
+	if request.user.is_authenticated:
+		cart_count = await cart_items.filter(cart__user=request.user).acount()
+	elif request.session.session_key:
+		cart_count = await cart_items.filter(cart__session_key=request.session.session_key).acount()
+	else:
+		cart_count = 0
+	request._global_context = {
+		'global_categories': categories,
+		'cart_count': cart_count,
+	}
+	return request._global_context
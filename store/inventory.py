@@ -0,0 +1,122 @@
+"""Product stock kept in shard rows outside the ``Product`` row.
+
+Each product's stock is split across ``settings.INVENTORY_SHARDS`` ``StockShard``
+rows. A purchase decrements one shard, picked at random, with a conditional
+``UPDATE ... WHERE quantity >= n``. Concurrent buyers of one hot SKU therefore
+lock different rows, and the product row (and its ``updated_at``) is never
+written. If no single shard can cover a line, the product's shards are locked
+in a fixed order and drained together.
+
+The available quantity is always exact: the sum of the shards. Purchases
+drain shards unevenly, so ``compact()`` (``manage.py compact_inventory``)
+periodically spreads each product's total evenly across its shards again.
+"""
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import StockShard
+
+
+class OutOfStock(Exception):
+	def __init__(self, product_id: int, requested: int, available: int):
+		super().__init__(f'Product {product_id}: requested {requested}, {available} available')
+		self.product_id = product_id
+		self.requested = requested
+		self.available = available
+
+
+def shard_count() -> int:
+	return getattr(settings, 'INVENTORY_SHARDS', 8)
+
+
+def _split(quantity: int, shards: int) -> list:
+	base, extra = divmod(quantity, shards)
+	return [base + (i < extra) for i in range(shards)]
+
+
+def available(product_id: int) -> int:
+	return StockShard.objects.filter(product_id=product_id).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def with_available(queryset):
+	"""Annotate products with ``available``, so ``in_stock`` needs no query per product."""
+	total = (
+		StockShard.objects.filter(product=OuterRef('pk'))
+		.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+	)
+	return queryset.annotate(available=Coalesce(Subquery(total, output_field=IntegerField()), Value(0)))
+
+
+@transaction.atomic
+def set_stock(product_id: int, quantity: int):
+	"""Replace the product's stock with ``quantity``, spread evenly over the shards."""
+	StockShard.objects.filter(product_id=product_id).delete()
+	StockShard.objects.bulk_create(
+		StockShard(product_id=product_id, shard=i, quantity=q) for i, q in enumerate(_split(quantity, shard_count()))
+	)
+
+
+def add_stock(product_id: int, quantity: int):
+	"""Restock (or put back) ``quantity`` units into one random shard."""
+	shard = random.randrange(shard_count())
+	updated = StockShard.objects.filter(product_id=product_id, shard=shard).update(quantity=F('quantity') + quantity)
+	if not updated:
+		StockShard.objects.bulk_create([StockShard(product_id=product_id, shard=shard)], ignore_conflicts=True)
+		StockShard.objects.filter(product_id=product_id, shard=shard).update(quantity=F('quantity') + quantity)
+
+
+def take(product_id: int, quantity: int):
+	"""Remove ``quantity`` units of the product or raise OutOfStock. Call inside the order's transaction."""
+	shards = shard_count()
+	start = random.randrange(shards)
+	for i in range(shards):
+		shard = (start + i) % shards
+		if StockShard.objects.filter(product_id=product_id, shard=shard, quantity__gte=quantity).update(
+			quantity=F('quantity') - quantity
+		):
+			return
+	_take_across_shards(product_id, quantity)
+
+
+@transaction.atomic
+def _take_across_shards(product_id: int, quantity: int):
+	rows = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('shard'))
+	total = sum(row.quantity for row in rows)
+	if total < quantity:
+		raise OutOfStock(product_id, quantity, total)
+	for row in rows:
+		used = min(row.quantity, quantity)
+		if used:
+			row.quantity -= used
+			quantity -= used
+	StockShard.objects.bulk_update(rows, ['quantity'])
+
+
+def compact(product_ids=None) -> int:
+	"""Spread each product's stock evenly over ``INVENTORY_SHARDS`` shards again. Returns products changed."""
+	shards = shard_count()
+	rows = StockShard.objects.all()
+	if product_ids is not None:
+		rows = rows.filter(product_id__in=product_ids)
+	changed = 0
+	for product_id in rows.order_by().values_list('product_id', flat=True).distinct():
+		with transaction.atomic():
+			current = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('shard'))
+			target = _split(sum(row.quantity for row in current), shards)
+			if [row.quantity for row in current] == target and [row.shard for row in current] == list(range(shards)):
+				continue
+			by_shard = {row.shard: row for row in current}
+			StockShard.objects.filter(product_id=product_id, shard__gte=shards).delete()
+			for shard, quantity in enumerate(target):
+				row = by_shard.get(shard)
+				if row is None:
+					StockShard.objects.create(product_id=product_id, shard=shard, quantity=quantity)
+				elif row.quantity != quantity:
+					row.quantity = quantity
+					row.save(update_fields=['quantity'])
+			changed += 1
+	return changed
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from store.analytics import CHUNK_SIZE, update_rollups
+
+
+class Command(BaseCommand):
+	help = 'Rebuild the sales rollups from the whole order history, in chunks.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Orders folded per transaction.')
+		parser.add_argument(
+			'--resume', action='store_true',
+			help='Continue an interrupted backfill from its watermark instead of starting over.',
+		)
+
+	def handle(self, *args, **options):
+		def progress(done, total):
+			self.stdout.write(f'  orders up to #{done} of #{total}')
+
+		since, until = update_rollups(reset=not options['resume'], chunk_size=options['chunk_size'], progress=progress)
+		self.stdout.write(self.style.SUCCESS(f'Backfilled sales rollups for orders {since}..{until}.'))
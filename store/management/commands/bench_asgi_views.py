@@ -0,0 +1,112 @@
+import asyncio
+import os
+import subprocess
+import sys
+from statistics import quantiles
+from time import perf_counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import Category, Product
+
+CSRF_SECRET = 'b' * 32
+
+
+class Command(BaseCommand):
+	help = (
+		'Compare requests/sec and p99 latency of the sync and async catalog views, '
+		'both served by the same in-process ASGI handler.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--variant', choices=['sync', 'async'], help='Run one variant only (used internally).')
+		parser.add_argument('--requests', type=int, default=400, help='Requests per route.')
+		parser.add_argument('--concurrency', type=int, default=32, help='In-flight requests.')
+
+	def handle(self, *args, **options):
+		if options['variant']:
+			return self._run_variant(options)
+		# STORE_ASYNC_VIEWS is read when the URLconf is imported, so each variant gets a fresh process.
+		for variant in ('sync', 'async'):
+			env = {**os.environ, 'STORE_ASYNC_VIEWS': '1' if variant == 'async' else ''}
+			subprocess.run([
+				sys.executable, sys.argv[0], 'bench_asgi_views', '--variant', variant,
+				'--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+			], env=env, check=True)
+
+	def _routes(self):
+		category = Category.objects.filter(is_active=True).first()
+		product = Product.objects.filter(is_active=True).first()
+		if category is None or product is None:
+			raise CommandError('No catalog to benchmark; run seed_demo first.')
+		return [
+			('home', 'GET', '/', b''),
+			('category_detail', 'GET', f'/category/{category.slug}/', b''),
+			('product_detail', 'GET', f'/product/{product.slug}/', b''),
+			('product_chat_api', 'POST', '/api/chat/', urlencode({'message': product.title.split()[0]}).encode()),
+		]
+
+	def _run_variant(self, options):
+		variant = options['variant']
+		if settings.STORE_ASYNC_VIEWS != (variant == 'async'):
+			raise CommandError('STORE_ASYNC_VIEWS does not match --variant.')
+		routes = self._routes()
+		app = ASGIHandler()
+		self.stdout.write(f"{variant} views, {options['requests']} requests/route, concurrency {options['concurrency']}")
+		for name, method, path, body in routes:
+			latencies, elapsed = asyncio.run(self._load(app, method, path, body, options['requests'], options['concurrency']))
+			p99 = quantiles(latencies, n=100)[98] * 1000
+			self.stdout.write(f"  {name:<18} {len(latencies) / elapsed:8.1f} req/s   p99 {p99:7.2f} ms")
+
+	async def _load(self, app, method, path, body, total, concurrency):
+		latencies = []
+		pending = iter(range(total))
+
+		async def worker():
+			for _ in pending:
+				start = perf_counter()
+				status = await self._request(app, method, path, body)
+				latencies.append(perf_counter() - start)
+				if status != 200:
+					raise CommandError(f'{method} {path} returned {status}')
+
+		# One warm-up request so template loading and URL resolution are not measured.
+		await self._request(app, method, path, body)
+		start = perf_counter()
+		await asyncio.gather(*(worker() for _ in range(concurrency)))
+		return latencies, perf_counter() - start
+
+	async def _request(self, app, method, path, body):
+		headers = [(b'host', b'localhost'), (b'cookie', f'csrftoken={CSRF_SECRET}'.encode())]
+		if method == 'POST':
+			headers += [
+				(b'content-type', b'application/x-www-form-urlencoded'),
+				(b'x-csrftoken', CSRF_SECRET.encode()),
+			]
+		scope = {
+			'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+			'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+			'headers': headers, 'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+		}
+		sent_body = False
+
+		async def receive():
+			nonlocal sent_body
+			if not sent_body:
+				sent_body = True
+				return {'type': 'http.request', 'body': body, 'more_body': False}
+			# The client never disconnects; the handler cancels this wait once it has responded.
+			await asyncio.Event().wait()
+
+		status = None
+
+		async def send(message):
+			nonlocal status
+			if message['type'] == 'http.response.start':
+				status = message['status']
+
+		await app(scope, receive, send)
+		return status
@@ -0,0 +1,101 @@
+import gc
+import tracemalloc
+from decimal import Decimal
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from store.catalog import CatalogSnapshot
+from store.models import Category, Product
+
+
+def _allocated(build):
+	"""(result, bytes still allocated once ``build()`` returns)."""
+	gc.collect()
+	tracemalloc.start()
+	result = build()
+	size = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return result, size
+
+
+class Command(BaseCommand):
+	help = (
+		'Compare the catalog snapshot with the ORM: memory held per active product and '
+		'latency of the home and category listings. Runs on a synthetic catalog that is rolled back.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--products', type=int, default=5000)
+		parser.add_argument('--categories', type=int, default=20)
+		parser.add_argument('--description-words', type=int, default=120, help='Length of each synthetic description.')
+		parser.add_argument('--rounds', type=int, default=200)
+
+	def handle(self, *args, **options):
+		with transaction.atomic():
+			category = self._seed(options)
+			self._run(category, options)
+			transaction.set_rollback(True)
+
+	def _seed(self, options):
+		categories = Category.objects.bulk_create(
+			Category(name=f'Bench category {i}', slug=f'bench-category-{i}') for i in range(options['categories'])
+		)
+		description = ' '.join(['lorem'] * options['description_words'])
+		Product.objects.bulk_create((
+			Product(
+				category=categories[i % len(categories)], title=f'Bench product {i}', slug=f'bench-product-{i}',
+				description=description, price=Decimal(100 + i % 900), discount_percent=i % 4 * 5,
+				thumbnail=f'products/thumbnails/bench-{i}.jpg',
+			)
+			for i in range(options['products'])
+		), batch_size=1000)
+		return categories[0]
+
+	def _run(self, category, options):
+		orm, orm_bytes = _allocated(lambda: list(Product.objects.filter(is_active=True).select_related('category')))
+		snap, snap_bytes = _allocated(lambda: CatalogSnapshot.load(version=0))
+		count = len(snap.products)
+		self.stdout.write(f'{count} active products, {len(snap.categories)} categories')
+		self.stdout.write(
+			f'  memory per product: ORM instances {orm_bytes / len(orm):7.0f} B   '
+			f'snapshot {snap_bytes / count:7.0f} B (incl. indexes)'
+		)
+		del orm
+
+		def orm_home():
+			return {'products': Product.objects.filter(is_active=True).select_related('category')[:24]}
+
+		def orm_category():
+			cat = Category.objects.get(slug=category.slug, is_active=True)
+			return {'category': cat, 'products': cat.products.filter(is_active=True)}
+
+		def snap_home():
+			return {'products': snap.products[:24]}
+
+		def snap_category():
+			cat = snap.category_by_slug[category.slug]
+			return {'category': cat, 'products': snap.products_by_category.get(cat.id, ())}
+
+		cases = [
+			('home (24)', 'store/home.html', orm_home, snap_home),
+			(f'category ({len(snap_category()["products"])})', 'store/category_detail.html', orm_category, snap_category),
+		]
+		for label, template, orm_context, snap_context in cases:
+			orm_ms = self._time(template, orm_context, options['rounds'])
+			snap_ms = self._time(template, snap_context, options['rounds'])
+			self.stdout.write(
+				f'  {label:<16} ORM {orm_ms:7.3f} ms   snapshot {snap_ms:7.3f} ms   ({orm_ms / snap_ms:.1f}x)'
+			)
+
+	def _time(self, template, context, rounds):
+		render_to_string(template, context())
+		timings = []
+		for _ in range(rounds):
+			start = perf_counter()
+			render_to_string(template, context())
+			timings.append(perf_counter() - start)
+		return median(timings) * 1000
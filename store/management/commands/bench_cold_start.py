@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter: boot the WSGI app, then serve one request to PATH.
+CHILD = r'''
+import io, json, sys, time
+boot = time.time()
+sys.path.insert(0, sys.argv[1])
+from wsgiref.util import setup_testing_defaults
+import ecommerce.wsgi
+ready = time.time()
+environ = {'PATH_INFO': sys.argv[2], 'HTTP_HOST': 'localhost', 'wsgi.errors': io.StringIO()}
+setup_testing_defaults(environ)
+status = []
+body = b''.join(ecommerce.wsgi.application(environ, lambda s, h, e=None: status.append(s)))
+done = time.time()
+print(json.dumps({'boot': boot, 'ready': ready, 'done': done, 'status': status[0]}))
+'''
+
+
+class Command(BaseCommand):
+	help = 'Measure process start to first response, with and without boot-time warmup.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--runs', type=int, default=5, help='Fresh processes per variant.')
+		parser.add_argument('--path', default='/', help='Path of the first request.')
+
+	def handle(self, *args, **options):
+		self.stdout.write(f"settings: {os.environ.get('DJANGO_SETTINGS_MODULE')}  first request: GET {options['path']}")
+		for label, warm in (('no warmup', ''), ('warmup', '1')):
+			env = {**os.environ, 'STORE_WARMUP_ON_START': warm}
+			totals, firsts = [], []
+			for _ in range(options['runs']):
+				start = time.time()
+				out = subprocess.run(
+					[sys.executable, '-c', CHILD, str(settings.BASE_DIR), options['path']],
+					env=env, check=True, capture_output=True, text=True,
+				)
+				result = json.loads(out.stdout.strip().splitlines()[-1])
+				totals.append(result['done'] - start)
+				firsts.append(result['done'] - result['ready'])
+			self.stdout.write(
+				f"  {label:<10} cold start {median(totals) * 1000:7.1f} ms   "
+				f"first request {median(firsts) * 1000:7.1f} ms   ({result['status']})"
+			)
@@ -0,0 +1,96 @@
+import threading
+from decimal import Decimal
+from time import perf_counter, sleep
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.test import override_settings
+
+from store import inventory
+from store.models import Cart, Category, Order, OrderItem, Product
+
+
+class Command(BaseCommand):
+	help = (
+		'Measure checkout throughput on one hot SKU with many concurrent buyers, '
+		'for different INVENTORY_SHARDS (1 shard = every buyer updates the same row).'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--buyers', type=int, default=32, help='Concurrent buyer threads.')
+		parser.add_argument('--purchases', type=int, default=25, help='Checkouts per buyer.')
+		parser.add_argument('--shards', default='1,8,32', help='Comma-separated shard counts to compare.')
+		parser.add_argument(
+			'--hold-ms', type=float, default=2.0,
+			help='Work done inside the checkout transaction after taking stock (e.g. writing the other lines).',
+		)
+
+	def handle(self, *args, **options):
+		self.user, _ = get_user_model().objects.get_or_create(username='bench-inventory')
+		category, _ = Category.objects.get_or_create(name='Benchmark')
+		self.stdout.write(
+			f"{options['buyers']} buyers x {options['purchases']} checkouts of one product, "
+			f"{options['hold_ms']} ms held per transaction, {connection.vendor}"
+		)
+		if connection.vendor == 'sqlite':
+			self.stdout.write('  (SQLite locks the whole database per write transaction, so shards cannot run in parallel here.)')
+		for shards in [int(n) for n in options['shards'].split(',')]:
+			product = Product.objects.create(category=category, title=f'Hot SKU {shards}', description='-', price=Decimal('10.00'))
+			try:
+				with override_settings(INVENTORY_SHARDS=shards):
+					inventory.set_stock(product.pk, options['buyers'] * options['purchases'])
+					self._run(product, shards, options)
+			finally:
+				orders = Order.objects.filter(items__product=product)
+				carts = list(orders.values_list('cart_id', flat=True))
+				OrderItem.objects.filter(product=product).delete()
+				Order.objects.filter(cart_id__in=carts).delete()
+				Cart.objects.filter(id__in=carts).delete()
+				product.delete()
+
+	def _run(self, product, shards, options):
+		latencies = []
+		errors = []
+		lock = threading.Lock()
+
+		def buyer():
+			try:
+				for _ in range(options['purchases']):
+					start = perf_counter()
+					self._checkout(product, options['hold_ms'] / 1000)
+					with lock:
+						latencies.append(perf_counter() - start)
+			except (OperationalError, inventory.OutOfStock) as exc:
+				errors.append(exc)
+			finally:
+				connection.close()
+
+		threads = [threading.Thread(target=buyer) for _ in range(options['buyers'])]
+		start = perf_counter()
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = perf_counter() - start
+		latencies.sort()
+		p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+		left = inventory.available(product.pk)
+		self.stdout.write(
+			f"  {shards:3} shard(s): {len(latencies) / elapsed:8.1f} checkouts/s  p99 {p99:8.2f} ms  "
+			f"stock left {left}  failed {len(errors)}"
+		)
+		if errors:
+			self.stdout.write(f'    first failure: {errors[0]}')
+
+	def _checkout(self, product, hold):
+		with transaction.atomic():
+			cart = Cart.objects.create(user=self.user, checked_out=True)
+			order = Order.objects.create(
+				user=self.user, cart=cart, total=product.price, full_name='Bench', email='bench@example.com',
+				address_line1='-', city='-', state='-', postal_code='-', country='-',
+			)
+			inventory.take(product.pk, 1)
+			OrderItem.objects.create(order=order, product=product, unit_price=product.price, quantity=1)
+			if hold:
+				sleep(hold)
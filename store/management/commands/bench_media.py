@@ -0,0 +1,77 @@
+import os
+import tempfile
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from store.media import serve_media
+
+
+def _drain(response) -> int:
+	size = 0
+	if response.streaming:
+		for chunk in response.streaming_content:
+			size += len(chunk)
+	else:
+		size = len(response.content)
+	response.close()
+	return size
+
+
+class Command(BaseCommand):
+	help = (
+		'Compare throughput of django.views.static.serve (the old DEBUG-only media route) '
+		'with store.media.serve_media for full, ranged and conditional GETs.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--size', type=int, default=1024, help='Test file size in KiB.')
+		parser.add_argument('--requests', type=int, default=500, help='Requests per case.')
+
+	def handle(self, *args, **options):
+		factory = RequestFactory()
+		size = options['size'] * 1024
+		with tempfile.TemporaryDirectory() as root:
+			name = 'bench.0123456789ab.jpg'
+			with open(os.path.join(root, name), 'wb') as f:
+				f.write(os.urandom(size))
+			with override_settings(MEDIA_ROOT=root, MEDIA_SERVE_MODE='django'):
+				etag = serve_media(factory.get('/'), name)['ETag']
+				cases = [
+					('full', {}),
+					('range 64KiB', {'HTTP_RANGE': 'bytes=0-65535'}),
+					('if-none-match', {'HTTP_IF_NONE_MATCH': etag}),
+				]
+				views = [
+					('static.serve', lambda request: serve(request, name, document_root=root)),
+					('serve_media', lambda request: serve_media(request, name)),
+				]
+				self.stdout.write(f"{options['size']} KiB file, {options['requests']} requests per case")
+				for case, headers in cases:
+					for label, view in views:
+						self._run(factory, view, case, label, headers, options['requests'])
+				with override_settings(MEDIA_SERVE_MODE='x-accel', MEDIA_ACCEL_PREFIX='/protected-media/'):
+					self._run(factory, views[1][1], 'full', 'x-accel', {}, options['requests'])
+		self.stdout.write(
+			'In-process figures only: behind gunicorn/uWSGI the full-file FileResponse goes out through '
+			'wsgi.file_wrapper (sendfile), and x-accel leaves the copy to nginx.'
+		)
+
+	def _run(self, factory, view, case, label, headers, count):
+		_drain(view(factory.get('/', **headers)))
+		timings = []
+		sent = 0
+		start = perf_counter()
+		for _ in range(count):
+			t = perf_counter()
+			response = view(factory.get('/', **headers))
+			sent += _drain(response)
+			timings.append(perf_counter() - t)
+		elapsed = perf_counter() - start
+		self.stdout.write(
+			f"  {case:<14} {label:<13} status {response.status_code}  {count / elapsed:9.1f} req/s  "
+			f"{sent / elapsed / 1e6:8.1f} MB/s  median {median(timings) * 1000:6.3f} ms"
+		)
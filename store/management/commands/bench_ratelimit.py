@@ -0,0 +1,44 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from store import ratelimit
+
+
+class Command(BaseCommand):
+	help = 'Measure the per-request overhead of the rate limiter on the configured cache.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--iterations', type=int, default=20000)
+
+	def _time(self, fn, iterations):
+		start = perf_counter()
+		for _ in range(iterations):
+			fn()
+		return (perf_counter() - start) / iterations * 1e6
+
+	def handle(self, *args, **options):
+		iterations = options['iterations']
+		self.stdout.write(f"cache backend: {settings.CACHES['default']['BACKEND']}")
+
+		request = RequestFactory().post('/api/chat/', {'message': 'phone'})
+		request.user = AnonymousUser()
+		request.session = SessionStore()
+		request.session.create()
+
+		# Generous enough that every call is allowed, so the full take path is measured.
+		open_rules = {'ip': f'{iterations * 10}/s', 'session': f'{iterations * 10}/s'}
+		closed_rules = {'ip': '1/h'}
+		ratelimit.check_request('bench_closed', request, closed_rules)
+
+		rows = [
+			('single bucket take', lambda: ratelimit.bucket.take('bench:single', iterations * 10, 1)),
+			('request, 2 scopes, allowed', lambda: ratelimit.check_request('bench_open', request, open_rules)),
+			('request, 1 scope, limited', lambda: ratelimit.check_request('bench_closed', request, closed_rules)),
+		]
+		for label, fn in rows:
+			self.stdout.write(f'  {label:<28} {self._time(fn, iterations):7.1f} us/call')
@@ -0,0 +1,45 @@
+from random import Random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+	help = 'Benchmark co-occurrence counting and top-K selection on synthetic order lines.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--lines', type=int, default=10_000_000, help='Total order lines to generate.')
+		parser.add_argument('--products', type=int, default=20_000, help='Catalog size.')
+		parser.add_argument('--max-basket', type=int, default=6, help='Largest basket size.')
+		parser.add_argument('--seed', type=int, default=42)
+
+	def _baskets(self, options):
+		rng = Random(options['seed'])
+		products, max_basket = options['products'], options['max_basket']
+		remaining = options['lines']
+		while remaining > 0:
+			size = min(remaining, rng.randint(1, max_basket))
+			remaining -= size
+			# Skewed popularity so a few products co-occur often, like real carts.
+			basket = {int(products * rng.random() ** 3) for _ in range(size)}
+			if len(basket) > 1:
+				yield basket
+
+	def handle(self, *args, **options):
+		backend = 'scipy' if recommendations.sparse is not None else 'python'
+		self.stdout.write(f"Counting pairs over {options['lines']:,} order lines ({backend} backend)...")
+		start = perf_counter()
+		counts = recommendations.count_pairs(self._baskets(options))
+		counted = perf_counter() - start
+
+		start = perf_counter()
+		directed = ((a, b, n) for (a, b), n in counts.items())
+		reverse = ((b, a, n) for (a, b), n in counts.items())
+		ranked = recommendations.top_k_from_pairs(list(directed) + list(reverse))
+		selected = perf_counter() - start
+
+		self.stdout.write(f"pairs: {len(counts):,}  products with neighbours: {len(ranked):,}")
+		self.stdout.write(f"count: {counted:.2f}s ({options['lines'] / counted:,.0f} lines/s)")
+		self.stdout.write(f"top-{recommendations.TOP_K}: {selected:.2f}s")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from store.recommendations import TOP_K, build_recommendations
+
+
+class Command(BaseCommand):
+	help = 'Update "frequently bought together" recommendations from orders placed since the last run.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--full', action='store_true', help='Rebuild from the whole order history.')
+		parser.add_argument('--top-k', type=int, default=TOP_K, help='Neighbours kept per product.')
+		parser.add_argument('--chunk-size', type=int, default=5000, help='Order lines fetched per round trip.')
+
+	def handle(self, *args, **options):
+		stats = build_recommendations(full=options['full'], k=options['top_k'], chunk_size=options['chunk_size'])
+		self.stdout.write(self.style.SUCCESS(
+			f"Orders {stats['since']}..{stats['until']}: {stats['pairs']} pairs, "
+			f"{stats['products']} products refreshed."
+		))
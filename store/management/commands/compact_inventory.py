@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import inventory
+
+
+class Command(BaseCommand):
+	help = "Spread each product's stock evenly over INVENTORY_SHARDS shard rows again (schedule it, e.g. hourly)."
+
+	def add_arguments(self, parser):
+		parser.add_argument('product_ids', nargs='*', type=int, help='Only these products (default: all).')
+
+	def handle(self, *args, **options):
+		changed = inventory.compact(options['product_ids'] or None)
+		self.stdout.write(self.style.SUCCESS(f'Compacted stock of {changed} product(s) into {inventory.shard_count()} shards.'))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from store import inventory
 from store.models import Category, Product, ProductImage
 from pathlib import Path
 from random import randint, choice
@@ -67,11 +68,11 @@ class Command(BaseCommand):
 					'description': desc,
 					'price': price,
 					'discount_percent': discount,
-					'stock': stock,
 					'thumbnail': thumb_rel and f'seed/{Path(thumb_rel).name}',
 				}
 			)
 			if created:
+				inventory.set_stock(p.pk, stock)
 				# Add 2 gallery images
 				for i in range(2):
 					img_rel = make_image(f"{title} gallery {i+1}", f"{title.lower().replace(' ','_')}_g{i+1}.jpg")
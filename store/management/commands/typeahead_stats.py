@@ -0,0 +1,49 @@
+from random import Random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from store.typeahead import index
+
+
+class Command(BaseCommand):
+	help = 'Build the typeahead index, report its memory footprint and time per-keystroke lookups.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--lookups', type=int, default=20000)
+
+	def handle(self, *args, **options):
+		start = perf_counter()
+		index.build()
+		built = perf_counter() - start
+		report = index.memory_report()
+		self.stdout.write(f"built in {built * 1000:.1f} ms: {report['entries']} entries, {report['keys']} keys")
+		self._memory(report)
+		keys = [key for key, _, _ in index._keys]
+		if not keys:
+			return
+		# Replay keystrokes: every prefix of randomly chosen keys, as a user types them.
+		rng = Random(7)
+		queries = []
+		while len(queries) < options['lookups']:
+			key = rng.choice(keys)
+			queries.extend(key[:n] for n in range(1, min(len(key), 12) + 1))
+		queries = queries[:options['lookups']]
+		timings = []
+		for query in queries:
+			t = perf_counter()
+			index.search(query)
+			timings.append(perf_counter() - t)
+		timings.sort()
+		self.stdout.write(
+			f"lookup over {len(queries)} keystrokes: median {timings[len(timings) // 2] * 1e6:.1f} us, "
+			f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} us, max {timings[-1] * 1e6:.1f} us"
+		)
+		self._memory(index.memory_report())
+
+	def _memory(self, report):
+		self.stdout.write(
+			f"memory: {report['total_bytes'] / 1024:.1f} KiB (keys {report['key_bytes'] / 1024:.1f} KiB, "
+			f"records {report['entry_bytes'] / 1024:.1f} KiB, {report['memoized_prefixes']} memoized prefixes "
+			f"{report['memo_bytes'] / 1024:.1f} KiB)"
+		)
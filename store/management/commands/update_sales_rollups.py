@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.analytics import CHUNK_SIZE, update_rollups
+
+
+class Command(BaseCommand):
+	help = 'Fold orders placed since the last run into the hourly/daily sales rollups.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Orders folded per transaction.')
+
+	def handle(self, *args, **options):
+		since, until = update_rollups(chunk_size=options['chunk_size'])
+		self.stdout.write(self.style.SUCCESS(f'Sales rollups updated for orders {since}..{until}.'))
@@ -0,0 +1,17 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from store.warmup import warmup
+
+
+class Command(BaseCommand):
+	help = 'Run the worker warmup (templates, URL patterns, catalog queries) and report how long it takes.'
+
+	def handle(self, *args, **options):
+		start = perf_counter()
+		stats = warmup()
+		self.stdout.write(self.style.SUCCESS(
+			f"Warmed {stats['templates']} templates and {stats['urls']} URL patterns "
+			f"in {(perf_counter() - start) * 1000:.1f} ms."
+		))
@@ -0,0 +1,145 @@
+"""Serving of uploaded files under ``MEDIA_ROOT``.
+
+``settings.MEDIA_SERVE_MODE`` selects how:
+
+- ``'x-accel'``: answer with an ``X-Accel-Redirect`` to ``MEDIA_ACCEL_PREFIX``
+  and let nginx send the file.
+- ``'x-sendfile'``: answer with an ``X-Sendfile`` path for Apache/lighttpd.
+- ``'django'``: send it from Python. Whole files go out as a ``FileResponse`` so
+  the server can use ``wsgi.file_wrapper``/``os.sendfile``; single byte ranges
+  are streamed.
+- ``'off'``: no Django route; the front server maps ``MEDIA_URL`` itself.
+
+All modes set an ETag, Last-Modified and Cache-Control. Content-hashed names
+(see ``HashedMediaStorage``) are cached for a year as ``immutable``.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class HashedMediaStorage(FileSystemStorage):
+	"""File storage that names uploads ``<name>.<content hash>.<ext>``.
+
+	Identical uploads share one file, and every name maps to fixed bytes, so
+	they can be cached forever.
+	"""
+
+	def save(self, name, content, max_length=None):
+		digest = hashlib.md5(usedforsecurity=False)
+		for chunk in content.chunks():
+			digest.update(chunk)
+		content.seek(0)
+		root, ext = os.path.splitext(name)
+		hashed = f'{root}.{digest.hexdigest()[:12]}{ext}'
+		if self.exists(hashed):
+			return hashed
+		return super().save(hashed, content, max_length=max_length)
+
+
+def _cache_headers(response, path: str, stat):
+	response['ETag'] = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+	response['Last-Modified'] = http_date(stat.st_mtime)
+	response['Accept-Ranges'] = 'bytes'
+	if HASHED_NAME_RE.search(path):
+		response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+	else:
+		response['Cache-Control'] = f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+	return response
+
+
+def _byte_range(header: str, size: int):
+	"""Parse a single ``bytes=`` range.
+
+	Returns ``None`` if the header is absent, invalid (``bytes=5-3``) or unsupported,
+	so the whole file is sent (RFC 7233 §3.1), and ``False`` if the range is valid
+	but lies beyond the end of the file.
+	"""
+	match = RANGE_RE.match(header.strip()) if header else None
+	if not match or not any(match.groups()):
+		return None
+	first, last = match.groups()
+	if first:
+		start = int(first)
+		if last and int(last) < start:
+			return None
+		end = min(int(last), size - 1) if last else size - 1
+	else:
+		suffix = int(last)
+		start = max(0, size - suffix)
+		end = size - 1 if suffix else -1
+	if start > end:
+		return False
+	return start, end
+
+
+def _stream(path: str, start: int, length: int):
+	with open(path, 'rb') as f:
+		f.seek(start)
+		while length > 0:
+			chunk = f.read(min(CHUNK_SIZE, length))
+			if not chunk:
+				break
+			length -= len(chunk)
+			yield chunk
+
+
+@require_safe
+def serve_media(request, path: str):
+	try:
+		fullpath = safe_join(settings.MEDIA_ROOT, path)
+		stat = os.stat(fullpath)
+	except OSError as exc:
+		raise Http404('File not found') from exc
+	if not Path(fullpath).is_file():
+		raise Http404('File not found')
+
+	etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+	if_none_match = request.headers.get('If-None-Match')
+	if (if_none_match and {etag, '*'} & {t.strip() for t in if_none_match.split(',')}) or (
+		not if_none_match and not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime)
+	):
+		return _cache_headers(HttpResponseNotModified(), path, stat)
+
+	content_type = mimetypes.guess_type(fullpath)[0] or 'application/octet-stream'
+	mode = getattr(settings, 'MEDIA_SERVE_MODE', 'django')
+	if mode == 'x-accel':
+		response = HttpResponse(content_type=content_type)
+		response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + path.lstrip('/')
+		return _cache_headers(response, path, stat)
+	if mode == 'x-sendfile':
+		response = HttpResponse(content_type=content_type)
+		response['X-Sendfile'] = fullpath
+		return _cache_headers(response, path, stat)
+
+	byte_range = _byte_range(request.headers.get('Range'), stat.st_size)
+	if_range = request.headers.get('If-Range')
+	if if_range and if_range != etag:
+		byte_range = None
+	if byte_range is False:
+		response = HttpResponse(status=416)
+		response['Content-Range'] = f'bytes */{stat.st_size}'
+		return _cache_headers(response, path, stat)
+	if byte_range is None:
+		response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+		return _cache_headers(response, path, stat)
+	start, end = byte_range
+	response = StreamingHttpResponse(_stream(fullpath, start, end - start + 1), status=206, content_type=content_type)
+	response['Content-Length'] = str(end - start + 1)
+	response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+	return _cache_headers(response, path, stat)
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.6 on 2026-10-19 19:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField(help_text='Start of the hour or day (UTC)')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='store.category')),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'abstract': False,
+                'unique_together': {('period', 'bucket', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField(help_text='Start of the hour or day (UTC)')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='store.product')),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'abstract': False,
+                'unique_together': {('period', 'bucket', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.6 on 2026-10-19 20:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Shards created for existing stock; compact_inventory adjusts to INVENTORY_SHARDS.
+SHARDS = 8
+
+
+def stock_to_shards(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    StockShard = apps.get_model('store', 'StockShard')
+    shards = []
+    for product_id, stock in Product.objects.values_list('id', 'stock').iterator():
+        base, extra = divmod(stock, SHARDS)
+        shards += [StockShard(product_id=product_id, shard=i, quantity=base + (i < extra)) for i in range(SHARDS)]
+    StockShard.objects.bulk_create(shards, batch_size=1000)
+
+
+def shards_to_stock(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    StockShard = apps.get_model('store', 'StockShard')
+    totals = StockShard.objects.values('product_id').annotate(total=models.Sum('quantity'))
+    for row in totals.iterator():
+        Product.objects.filter(id=row['product_id']).update(stock=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_order_history_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_shards', to='store.product')),
+            ],
+            options={
+                'unique_together': {('product', 'shard')},
+            },
+        ),
+        migrations.RunPython(stock_to_shards, shards_to_stock),
+        migrations.RemoveField(
+            model_name='product',
+            name='stock',
+        ),
+    ]
@@ -1,9 +1,17 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
 
 
+def discounted_price(price, discount_percent):
+	"""``price`` less ``discount_percent`` percent, rounded to cents."""
+	if discount_percent:
+		return round(price * (100 - discount_percent) / 100, 2)
+	return price
+
+
 class Category(models.Model):
 	name = models.CharField(max_length=80, unique=True)
 	slug = models.SlugField(max_length=100, unique=True, blank=True)
@@ -28,7 +36,6 @@ class Product(models.Model):
 	description = models.TextField()
 	price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
 	discount_percent = models.PositiveIntegerField(default=0, validators=[MinValueValidator(0)])
-	stock = models.PositiveIntegerField(default=0)
 	thumbnail = models.ImageField(upload_to='products/thumbnails/', blank=True, null=True)
 	is_active = models.BooleanField(default=True)
 	created_at = models.DateTimeField(auto_now_add=True)
@@ -44,18 +51,39 @@ class Product(models.Model):
 
 	@property
 	def discounted_price(self):
-		if self.discount_percent:
-			return round(self.price * (100 - self.discount_percent) / 100, 2)
-		return self.price
+		return discounted_price(self.price, self.discount_percent)
+
+	@property
+	def thumbnail_url(self) -> str:
+		return self.thumbnail.url if self.thumbnail else ''
+
+	@cached_property
+	def available(self) -> int:
+		# Querysets from store.inventory.with_available() set this up front.
+		from .inventory import available
+		return available(self.pk)
 
 	@property
 	def in_stock(self) -> bool:
-		return self.stock > 0 and self.is_active
+		return self.is_active and self.available > 0
 
 	def __str__(self) -> str:
 		return self.title
 
 
+class StockShard(models.Model):
+	"""One of the rows a product's stock is split across (see store.inventory)."""
+	product = models.ForeignKey(Product, related_name='stock_shards', on_delete=models.CASCADE)
+	shard = models.PositiveSmallIntegerField()
+	quantity = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		unique_together = ('product', 'shard')
+
+	def __str__(self) -> str:
+		return f"{self.product_id}#{self.shard}: {self.quantity}"
+
+
 class ProductImage(models.Model):
 	product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
 	image = models.ImageField(upload_to='products/gallery/')
@@ -131,6 +159,9 @@ class Order(models.Model):
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 
+	class Meta:
+		indexes = [models.Index(fields=['user', '-created_at', '-id'], name='store_order_user_recent_idx')]
+
 	def __str__(self):
 		return f"Order #{self.id} - {self.user} - {self.status}"
 
@@ -147,3 +178,80 @@ class OrderItem(models.Model):
 
 	def __str__(self):
 		return f"{self.product.title} x {self.quantity}"
+
+
+class JobWatermark(models.Model):
+	"""High-water mark for incremental background jobs (last processed row id)."""
+	name = models.CharField(max_length=60, unique=True)
+	last_id = models.BigIntegerField(default=0)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"{self.name} @ {self.last_id}"
+
+
+class ProductPairCount(models.Model):
+	"""How many orders contained both products. Stored in both directions."""
+	product = models.ForeignKey(Product, related_name='pair_counts', on_delete=models.CASCADE)
+	other = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+	count = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		unique_together = ('product', 'other')
+
+	def __str__(self):
+		return f"{self.product_id} & {self.other_id}: {self.count}"
+
+
+class ProductRecommendation(models.Model):
+	"""Materialized top-K "frequently bought together" neighbours of a product."""
+	product = models.ForeignKey(Product, related_name='recommendations', on_delete=models.CASCADE)
+	recommended = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+	score = models.PositiveIntegerField(default=0)
+	rank = models.PositiveSmallIntegerField(default=0)
+
+	class Meta:
+		ordering = ['product', 'rank']
+		indexes = [models.Index(fields=['product', 'rank'])]
+
+	def __str__(self):
+		return f"{self.product_id} -> {self.recommended_id} (#{self.rank})"
+
+
+class SalesRollup(models.Model):
+	HOUR = 'hour'
+	DAY = 'day'
+	PERIOD_CHOICES = [
+		(HOUR, 'Hourly'),
+		(DAY, 'Daily'),
+	]
+
+	period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+	bucket = models.DateTimeField(help_text="Start of the hour or day (UTC)")
+	revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	units = models.PositiveIntegerField(default=0)
+	orders = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		abstract = True
+		ordering = ['-bucket']
+
+
+class ProductSalesRollup(SalesRollup):
+	product = models.ForeignKey(Product, related_name='sales_rollups', on_delete=models.CASCADE)
+
+	class Meta(SalesRollup.Meta):
+		unique_together = ('period', 'bucket', 'product')
+
+	def __str__(self):
+		return f"{self.product_id} {self.period} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class CategorySalesRollup(SalesRollup):
+	category = models.ForeignKey(Category, related_name='sales_rollups', on_delete=models.CASCADE)
+
+	class Meta(SalesRollup.Meta):
+		unique_together = ('period', 'bucket', 'category')
+
+	def __str__(self):
+		return f"{self.category_id} {self.period} {self.bucket:%Y-%m-%d %H:%M}"
@@ -0,0 +1,50 @@
+"""Performance budgets for every storefront route, enforced by store.tests.PerformanceBudgetTests.
+
+Each entry caps one request of the route, made by a logged-in customer with a
+three-line cart against the catalog seeded by the test:
+
+- ``queries``: SQL queries run.
+- ``duplicates``: queries with the same shape (SQL with literals blanked out)
+  as an earlier one in the same request; N+1 loops show up here first.
+- ``time``: wall time (fastest of several rounds) as a multiple of the
+  ``BASELINE`` request's. Timing is noisy on shared machines, so it is only
+  checked when ``PERF_BUDGETS_TIMING=1`` is set; the query budgets always are.
+
+Keys are URL names from store/urls.py plus ``ws_chat`` (connect and one
+message on the /ws/chat/ consumer). A route without a budget fails the suite,
+so new routes get one here. Lower a budget when a change beats it; raising one
+needs a reason in the commit.
+"""
+
+# The login page renders base.html with the global context processor and nothing else.
+BASELINE = 'login'
+
+BUDGETS = {
+	'home': {'queries': 4, 'duplicates': 0, 'time': 4.0},
+	'category_detail': {'queries': 4, 'duplicates': 0, 'time': 3.0},
+	'product_detail': {'queries': 8, 'duplicates': 0, 'time': 3.5},
+	'cart_detail': {'queries': 5, 'duplicates': 0, 'time': 2.5},
+	'add_to_cart': {'queries': 6, 'duplicates': 0, 'time': 2.0},
+	'update_cart_item': {'queries': 5, 'duplicates': 0, 'time': 2.0},
+	# Served from the in-process index.
+	'typeahead_api': {'queries': 0, 'duplicates': 0, 'time': 0.5},
+	'cart_api_add': {'queries': 7, 'duplicates': 0, 'time': 2.0},
+	'cart_api_update': {'queries': 6, 'duplicates': 0, 'time': 2.0},
+	'cart_api_remove': {'queries': 6, 'duplicates': 0, 'time': 2.0},
+	'cart_api_batch': {'queries': 8, 'duplicates': 0, 'time': 2.5},
+	# One stock-shard UPDATE and one OrderItem INSERT per cart line, so two duplicates
+	# per line after the first. The INSERTs stay per row: their post_save counts the
+	# sale in the typeahead ranking.
+	'checkout': {'queries': 14, 'duplicates': 4, 'time': 4.0},
+	# Without Stripe keys this falls back to checkout (and its rate limit), which loads the cart lines again.
+	'stripe_checkout': {'queries': 15, 'duplicates': 5, 'time': 5.0},
+	'checkout_success': {'queries': 4, 'duplicates': 0, 'time': 2.0},
+	'order_list': {'queries': 7, 'duplicates': 0, 'time': 4.5},
+	'order_detail': {'queries': 7, 'duplicates': 0, 'time': 3.0},
+	'register': {'queries': 4, 'duplicates': 0, 'time': 2.5},
+	'login': {'queries': 4, 'duplicates': 0, 'time': 1.0},
+	'logout': {'queries': 4, 'duplicates': 0, 'time': 1.5},
+	'product_chat_api': {'queries': 3, 'duplicates': 0, 'time': 2.0},
+	# Anonymous connection: no session or user lookup.
+	'ws_chat': {'queries': 1, 'duplicates': 0, 'time': 2.0},
+}
@@ -0,0 +1,161 @@
+"""Token-bucket rate limiting for the expensive storefront routes.
+
+Buckets are kept per client IP, session and user in the default cache, so all
+workers share them when the cache is shared (Redis). On Redis the
+refill-and-take step is a single Lua script; other backends serialize it with
+a short ``cache.add()`` lock. Limits per route come from ``settings.RATE_LIMITS``.
+"""
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+KEY_PREFIX = 'rl'
+# WebSocket close code for rate-limited chat connections (4000-4999 are application codes).
+RATE_LIMITED_CLOSE_CODE = 4429
+
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+	tokens = tokens - 1
+else
+	wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+def parse_rate(rate: str):
+	"""``'30/m'`` -> ``(30, 60)``: bucket capacity and the seconds it takes to refill."""
+	count, _, period = rate.partition('/')
+	return int(count), PERIODS[period]
+
+
+class TokenBucket:
+	def __init__(self, backend=None):
+		self.cache = backend or cache
+		self._scripts = {}
+
+	def take(self, key: str, capacity: int, period: int) -> float:
+		"""Take one token from ``key``. Returns 0 if allowed, else seconds until one is available."""
+		rate = capacity / period
+		key = f'{KEY_PREFIX}:{key}'
+		client = self._redis_client(key)
+		if client is not None:
+			script = self._scripts.get(id(client))
+			if script is None:
+				script = self._scripts[id(client)] = client.register_script(TAKE_SCRIPT)
+			return float(script(keys=[self.cache.make_key(key)], args=[capacity, rate]))
+		return self._take_locked(key, capacity, rate)
+
+	def _redis_client(self, key):
+		get_client = getattr(getattr(self.cache, '_cache', None), 'get_client', None)
+		if get_client is None:
+			return None
+		return get_client(self.cache.make_key(key), write=True)
+
+	def _take_locked(self, key: str, capacity: int, rate: float) -> float:
+		lock = f'{key}:lock'
+		for _ in range(50):
+			if self.cache.add(lock, 1, timeout=1):
+				break
+			time.sleep(0.001)
+		else:
+			# Only one identity hammering a single bucket contends this hard; treat it as limited.
+			return 1 / rate
+		try:
+			now = time.time()
+			tokens, ts = self.cache.get(key) or (capacity, now)
+			tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+			wait = 0.0
+			if tokens >= 1:
+				tokens -= 1
+			else:
+				wait = (1 - tokens) / rate
+			self.cache.set(key, (tokens, now), timeout=int(capacity / rate) + 1)
+			return wait
+		finally:
+			self.cache.delete(lock)
+
+
+bucket = TokenBucket()
+
+
+def _check(route: str, identities: dict, rules=None) -> float:
+	"""Take a token for each configured scope of ``route``; return the wait of the first that refuses (0 = allowed).
+
+	Scopes after a refusal are not touched, so a rejected request does not drain
+	the buckets it never got to use.
+	"""
+	if not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+		return 0.0
+	rules = rules if rules is not None else getattr(settings, 'RATE_LIMITS', {}).get(route, {})
+	for scope, rate in rules.items():
+		identity = identities.get(scope)
+		if identity:
+			capacity, period = parse_rate(rate)
+			wait = bucket.take(f'{route}:{scope}:{identity}', capacity, period)
+			if wait:
+				return wait
+	return 0.0
+
+
+def check_request(route: str, request, rules=None) -> float:
+	user = getattr(request, 'user', None)
+	return _check(route, {
+		'ip': request.META.get(getattr(settings, 'RATE_LIMIT_IP_META', 'REMOTE_ADDR')),
+		'session': request.session.session_key if hasattr(request, 'session') else None,
+		'user': user.pk if user is not None and user.is_authenticated else None,
+	}, rules)
+
+
+def check_scope(route: str, scope: dict, rules=None) -> float:
+	"""Same as check_request for a Channels connection scope."""
+	session = scope.get('session')
+	user = scope.get('user')
+	return _check(route, {
+		'ip': (scope.get('client') or [None])[0],
+		'session': session.session_key if session is not None else None,
+		'user': user.pk if user is not None and user.is_authenticated else None,
+	}, rules)
+
+
+def _too_many_requests(wait: float) -> JsonResponse:
+	response = JsonResponse({'error': 'Too many requests, please slow down.'}, status=429)
+	response['Retry-After'] = str(max(1, round(wait)))
+	return response
+
+
+def rate_limit(route: str):
+	"""Limit a view with the ``settings.RATE_LIMITS[route]`` buckets, answering 429 when empty."""
+	def decorator(view):
+		if iscoroutinefunction(view):
+			@wraps(view)
+			async def _wrapped(request, *args, **kwargs):
+				wait = await sync_to_async(check_request)(route, request)
+				if wait:
+					return _too_many_requests(wait)
+				return await view(request, *args, **kwargs)
+		else:
+			@wraps(view)
+			def _wrapped(request, *args, **kwargs):
+				wait = check_request(route, request)
+				if wait:
+					return _too_many_requests(wait)
+				return view(request, *args, **kwargs)
+		return _wrapped
+	return decorator
@@ -0,0 +1,184 @@
+"""Offline "frequently bought together" recommendations.
+
+Item-item co-occurrence is counted from ``OrderItem`` rows grouped by order,
+stored per product pair in ``ProductPairCount`` and materialized into the
+top-K ``ProductRecommendation`` rows that the product page reads.
+"""
+from collections import Counter, defaultdict
+from heapq import nlargest
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .models import JobWatermark, Order, OrderItem, Product, ProductPairCount, ProductRecommendation
+
+try:
+	import numpy as np
+	from scipy import sparse
+except ImportError:
+	np = None
+	sparse = None
+
+WATERMARK_NAME = 'recommendations'
+TOP_K = getattr(settings, 'RECOMMENDATION_TOP_K', 8)
+BATCH_SIZE = 1000
+
+
+def iter_baskets(since_order_id: int = 0, until_order_id=None, chunk_size: int = 5000):
+	"""Stream the distinct product ids of each order with id in (since, until]."""
+	items = OrderItem.objects.filter(order_id__gt=since_order_id).exclude(order__status=Order.CANCELLED)
+	if until_order_id is not None:
+		items = items.filter(order_id__lte=until_order_id)
+	rows = items.order_by('order_id').values_list('order_id', 'product_id').iterator(chunk_size=chunk_size)
+	for _, group in groupby(rows, key=itemgetter(0)):
+		basket = {product_id for _, product_id in group}
+		if len(basket) > 1:
+			yield basket
+
+
+def count_pairs(baskets, chunk_size: int = 50000) -> Counter:
+	"""Return ``{(a, b): orders}`` with ``a < b`` for every product pair sharing a basket.
+
+	Uses a sparse basket matrix product (``B.T @ B``) when SciPy is installed and
+	falls back to plain pair enumeration otherwise.
+	"""
+	if sparse is None:
+		return _count_pairs_python(baskets)
+	return _count_pairs_sparse(baskets, chunk_size)
+
+
+def _count_pairs_python(baskets) -> Counter:
+	counts = Counter()
+	for basket in baskets:
+		counts.update(combinations(sorted(basket), 2))
+	return counts
+
+
+def _count_pairs_sparse(baskets, chunk_size: int) -> Counter:
+	total = None
+	rows, cols, n_orders = [], [], 0
+	for basket in baskets:
+		rows.extend([n_orders] * len(basket))
+		cols.extend(basket)
+		n_orders += 1
+		if n_orders >= chunk_size:
+			total = _accumulate(total, rows, cols, n_orders)
+			rows, cols, n_orders = [], [], 0
+	if n_orders:
+		total = _accumulate(total, rows, cols, n_orders)
+	if total is None:
+		return Counter()
+	upper = sparse.triu(total, k=1).tocoo()
+	return Counter(dict(zip(zip(upper.row.tolist(), upper.col.tolist()), upper.data.tolist())))
+
+
+def _accumulate(total, rows, cols, n_orders):
+	width = max(cols) + 1
+	baskets = sparse.csr_matrix(
+		(np.ones(len(rows), dtype=np.int32), (np.asarray(rows), np.asarray(cols))),
+		shape=(n_orders, width),
+	)
+	cooc = (baskets.T @ baskets).tocsr()
+	if total is None:
+		return cooc
+	size = max(total.shape[0], width)
+	total.resize((size, size))
+	cooc.resize((size, size))
+	return total + cooc
+
+
+def top_k_from_pairs(pairs, k: int = TOP_K) -> dict:
+	"""Pick the k strongest neighbours per product from ``(product, other, count)`` rows."""
+	neighbours = defaultdict(list)
+	for product_id, other_id, count in pairs:
+		neighbours[product_id].append((count, -other_id))
+	return {
+		product_id: [(-neg_other, count) for count, neg_other in nlargest(k, scored)]
+		for product_id, scored in neighbours.items()
+	}
+
+
+def _chunks(values, size: int = BATCH_SIZE):
+	values = list(values)
+	for start in range(0, len(values), size):
+		yield values[start:start + size]
+
+
+def _apply_pair_counts(counts: Counter, full: bool) -> set:
+	"""Add ``counts`` onto the stored pair table and return the product ids touched."""
+	directed = Counter()
+	for (a, b), n in counts.items():
+		directed[(a, b)] += n
+		directed[(b, a)] += n
+	touched = {a for a, _ in directed}
+	if full:
+		ProductPairCount.objects.all().delete()
+		existing = {}
+	else:
+		existing = {}
+		for ids in _chunks(touched):
+			for row in ProductPairCount.objects.filter(product_id__in=ids):
+				existing[(row.product_id, row.other_id)] = row
+	to_update, to_create = [], []
+	for (a, b), n in directed.items():
+		row = existing.get((a, b))
+		if row is None:
+			to_create.append(ProductPairCount(product_id=a, other_id=b, count=n))
+		else:
+			row.count += n
+			to_update.append(row)
+	ProductPairCount.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+	ProductPairCount.objects.bulk_update(to_update, ['count'], batch_size=BATCH_SIZE)
+	return touched
+
+
+def _materialize(product_ids, k: int):
+	for ids in _chunks(product_ids):
+		pairs = ProductPairCount.objects.filter(product_id__in=ids).values_list('product_id', 'other_id', 'count')
+		ranked = top_k_from_pairs(pairs, k)
+		ProductRecommendation.objects.filter(product_id__in=ids).delete()
+		ProductRecommendation.objects.bulk_create([
+			ProductRecommendation(product_id=product_id, recommended_id=other_id, score=count, rank=rank)
+			for product_id, neighbours in ranked.items()
+			for rank, (other_id, count) in enumerate(neighbours)
+		], batch_size=BATCH_SIZE)
+
+
+def build_recommendations(full: bool = False, k: int = TOP_K, chunk_size: int = 5000) -> dict:
+	"""Fold orders placed since the last run into the pair table and refresh top-K rows.
+
+	With ``full=True`` the pair table and recommendations are rebuilt from scratch.
+	"""
+	watermark, _ = JobWatermark.objects.get_or_create(name=WATERMARK_NAME)
+	since = 0 if full else watermark.last_id
+	until = Order.objects.aggregate(last=Max('id'))['last'] or 0
+	if until <= since and not full:
+		return {'since': since, 'until': until, 'pairs': 0, 'products': 0}
+	counts = count_pairs(iter_baskets(since, until, chunk_size))
+	with transaction.atomic():
+		if full:
+			ProductRecommendation.objects.all().delete()
+		touched = _apply_pair_counts(counts, full)
+		_materialize(touched, k)
+		watermark.last_id = until
+		watermark.save(update_fields=['last_id', 'updated_at'])
+	return {'since': since, 'until': until, 'pairs': len(counts), 'products': len(touched)}
+
+
+def recommendations_for(product: Product, limit: int = TOP_K):
+	"""Recommended products for ``product`` in rank order, in a single query."""
+	return [
+		rec.recommended
+		for rec in product.recommendations.filter(recommended__is_active=True).select_related('recommended')[:limit]
+	]
+
+
+async def arecommendations_for(product: Product, limit: int = TOP_K):
+	"""Async counterpart of recommendations_for."""
+	return [
+		rec.recommended
+		async for rec in product.recommendations.filter(recommended__is_active=True).select_related('recommended')[:limit]
+	]
@@ -0,0 +1,45 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog, typeahead
+from .models import Category, OrderItem, Product
+
+
+def _catalog_changed():
+	catalog.bump_version()
+	# Bump again at commit, so a worker that reloaded in between does not keep pre-commit data.
+	transaction.on_commit(catalog.bump_version)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+	typeahead.product_changed(instance)
+	_catalog_changed()
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+	typeahead.index.remove(typeahead.PRODUCT, instance.pk)
+	_catalog_changed()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+	typeahead.category_changed(instance)
+	_catalog_changed()
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+	typeahead.index.remove(typeahead.CATEGORY, instance.pk)
+	_catalog_changed()
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, created, **kwargs):
+	if created:
+		# Only count the sale once the order is committed; a checkout that rolls back sold nothing.
+		transaction.on_commit(partial(typeahead.index.add_sale, instance.product_id))
@@ -1,3 +1,844 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from time import perf_counter
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+
+from .models import (
+	Cart, CartItem, Category, CategorySalesRollup, JobWatermark, Order, OrderItem, Product, ProductImage,
+	ProductPairCount, ProductRecommendation, ProductSalesRollup, SalesRollup, StockShard,
+)
+from . import analytics, catalog, inventory, perf_budgets, ratelimit, recommendations, typeahead, views, warmup
+from .media import HashedMediaStorage
+from .recommendations import build_recommendations
+from .routing import websocket_urlpatterns
+from .urls import urlpatterns as store_urlpatterns
+from .views import ORDER_HISTORY_PAGE_SIZE
+
+
+def make_order(user, lines, status=Order.PENDING, created_at=None, **fields) -> Order:
+	"""A checked-out order of ``user`` for ``lines``: products, or ``(product, quantity)`` pairs."""
+	lines = [line if isinstance(line, tuple) else (line, 1) for line in lines]
+	order = Order.objects.create(
+		user=user, cart=Cart.objects.create(user=user, checked_out=True), status=status,
+		total=sum((product.price * quantity for product, quantity in lines), Decimal('0.00')),
+		full_name='Buyer', email='b@example.com', phone='', address_line1='1 Street', city='Town', state='ST',
+		postal_code='00000', country='US', **fields,
+	)
+	OrderItem.objects.bulk_create(
+		OrderItem(order=order, product=product, unit_price=product.price, quantity=quantity) for product, quantity in lines
+	)
+	if created_at is not None:
+		# created_at is auto_now_add, so it can only be backdated with an update.
+		Order.objects.filter(pk=order.pk).update(created_at=created_at)
+	return order
+
+
+class OrderHistoryTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = get_user_model().objects.create_user('buyer', password='pw')
+		cls.other = get_user_model().objects.create_user('other', password='pw')
+		category = Category.objects.create(name='Phones')
+		cls.products = [
+			Product.objects.create(category=category, title=f'Phone {i}', description='-', price=Decimal('10.00'))
+			for i in range(6)
+		]
+
+	def setUp(self):
+		self.client.force_login(self.user)
+		# The first request creates the user's cart; keep that out of the measured requests.
+		self.client.get('/orders/')
+
+	def _place_order(self, user, lines):
+		return make_order(user, self.products[:lines])
+
+	def _count_queries(self, url):
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		return len(ctx.captured_queries)
+
+	def test_list_query_count_is_constant(self):
+		self._place_order(self.user, 1)
+		small = self._count_queries('/orders/')
+		for _ in range(ORDER_HISTORY_PAGE_SIZE):
+			self._place_order(self.user, 6)
+		self.assertEqual(self._count_queries('/orders/'), small)
+
+	def test_detail_query_count_is_constant(self):
+		small = self._count_queries(f'/orders/{self._place_order(self.user, 1).id}/')
+		large = self._count_queries(f'/orders/{self._place_order(self.user, 6).id}/')
+		self.assertEqual(large, small)
+
+	def test_keyset_pagination_walks_every_order_once(self):
+		placed = [self._place_order(self.user, 1).id for _ in range(ORDER_HISTORY_PAGE_SIZE * 2 + 3)]
+		seen, url = [], '/orders/'
+		while url:
+			response = self.client.get(url)
+			seen.extend(order.id for order in response.context['orders'])
+			cursor = response.context['next_cursor']
+			url = cursor and '/orders/?' + urlencode({'before': cursor})
+		self.assertEqual(seen, sorted(placed, reverse=True))
+
+	def test_other_users_orders_are_hidden(self):
+		order = self._place_order(self.other, 1)
+		self.assertEqual(self.client.get(f'/orders/{order.id}/').status_code, 404)
+		self.assertEqual(list(self.client.get('/orders/').context['orders']), [])
+
+
+class CartApiTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		category = Category.objects.create(name='Audio')
+		cls.headphones = Product.objects.create(
+			category=category, title='Headphones', description='-', price=Decimal('100.00'), discount_percent=10,
+		)
+		cls.cable = Product.objects.create(category=category, title='Cable', description='-', price=Decimal('5.00'))
+
+	def _add(self, product, quantity=1):
+		return self.client.post(f'/api/cart/add/{product.slug}/', {'quantity': quantity}).json()
+
+	def test_add_returns_line_totals_and_badge(self):
+		data = self._add(self.headphones, 2)
+		self.assertEqual(data['cart'], {'count': 1, 'total': '180.00'})
+		self.assertEqual(data['lines'][0]['quantity'], 2)
+		self.assertEqual(data['lines'][0]['subtotal'], '180.00')
+		data = self._add(self.headphones)
+		self.assertEqual(data['lines'][0]['quantity'], 3)
+
+	def test_update_and_remove(self):
+		line_id = self._add(self.headphones)['lines'][0]['id']
+		self._add(self.cable)
+		data = self.client.post(f'/api/cart/item/{line_id}/', {'quantity': 4}).json()
+		self.assertEqual(data['cart'], {'count': 2, 'total': '365.00'})
+		data = self.client.post(f'/api/cart/item/{line_id}/remove/').json()
+		self.assertEqual(data['removed'], [line_id])
+		self.assertEqual(data['cart'], {'count': 1, 'total': '5.00'})
+
+	def test_batch_update_sets_and_removes_lines(self):
+		first = self._add(self.headphones)['lines'][0]['id']
+		second = self._add(self.cable)['lines'][0]['id']
+		response = self.client.post(
+			'/api/cart/batch/',
+			json.dumps({'lines': [{'id': first, 'quantity': 0}, {'id': second, 'quantity': 3}]}),
+			content_type='application/json',
+		)
+		data = response.json()
+		self.assertEqual(data['removed'], [first])
+		self.assertEqual([line['quantity'] for line in data['lines']], [3])
+		self.assertEqual(data['cart'], {'count': 1, 'total': '15.00'})
+		self.assertEqual(CartItem.objects.count(), 1)
+
+	def test_rejects_bad_input_and_foreign_lines(self):
+		self.assertEqual(self.client.post(f'/api/cart/add/{self.cable.slug}/', {'quantity': 'x'}).status_code, 400)
+		other = Cart.objects.create(session_key='someone-else')
+		foreign = CartItem.objects.create(cart=other, product=self.cable, quantity=1)
+		self.assertEqual(self.client.post(f'/api/cart/item/{foreign.id}/', {'quantity': 2}).status_code, 404)
+		response = self.client.post(
+			'/api/cart/batch/', json.dumps({'lines': [{'id': foreign.id, 'quantity': 2}]}), content_type='application/json',
+		)
+		self.assertEqual(response.status_code, 400)
+
+
+class TypeaheadTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.category = Category.objects.create(name='Phones')
+		cls.nova = Product.objects.create(category=cls.category, title='Nova Phone X', description='-', price=1)
+		cls.pixel = Product.objects.create(category=cls.category, title='Pixel Phone', description='-', price=1)
+
+	def setUp(self):
+		typeahead.index.build()
+
+	def test_matches_word_starts_ranked_by_popularity_without_queries(self):
+		typeahead.index.add_sale(self.pixel.pk)
+		with self.assertNumQueries(0):
+			results = self.client.get('/api/typeahead/?q=pho').json()['results']
+		self.assertEqual([r['label'] for r in results], ['Phones', 'Pixel Phone', 'Nova Phone X'])
+		self.assertEqual(results[1]['url'], f'/product/{self.pixel.slug}/')
+
+	def test_signals_keep_index_current(self):
+		self.nova.title = 'Zeta Phone'
+		self.nova.save()
+		self.assertEqual([s.label for s in typeahead.index.search('zet')], ['Zeta Phone'])
+		self.assertEqual(typeahead.index.search('nova'), [])
+		self.nova.is_active = False
+		self.nova.save()
+		self.assertEqual(typeahead.index.search('zet'), [])
+		self.pixel.delete()
+		self.assertEqual([s.label for s in typeahead.index.search('p')], ['Phones'])
+
+	def test_changes_saved_during_a_build_survive_it(self):
+		keys = typeahead._keys
+		saved = []
+
+		def save_midway(label):
+			# The build has read the database; rename a product before it publishes the new index.
+			if not saved:
+				saved.append(label)
+				self.nova.title = 'Zeta Phone'
+				self.nova.save()
+			return keys(label)
+
+		with mock.patch.object(typeahead, '_keys', side_effect=save_midway):
+			typeahead.index.build()
+		self.assertEqual([s.label for s in typeahead.index.search('zet')], ['Zeta Phone'])
+		self.assertEqual(typeahead.index.search('nova'), [])
+
+	@override_settings(INVENTORY_SHARDS=1)
+	def test_only_committed_orders_count_as_sales(self):
+		def popularity():
+			return typeahead.index.search('nova')[0].popularity
+
+		inventory.set_stock(self.nova.pk, 5)
+		inventory.set_stock(self.pixel.pk, 0)
+		self.client.force_login(get_user_model().objects.create_user('buyer', password='pw'))
+		self.client.post(f'/api/cart/add/{self.nova.slug}/', {'quantity': 1})
+		self.client.post(f'/api/cart/add/{self.pixel.slug}/', {'quantity': 1})
+		with self.captureOnCommitCallbacks(execute=True):
+			# The Nova line is written before the Pixel shortage rolls the order back.
+			self.assertEqual(self.client.post('/checkout/', {'full_name': 'Buyer'}).status_code, 409)
+		self.assertEqual(popularity(), 0)
+		CartItem.objects.filter(product=self.pixel).delete()
+		with self.captureOnCommitCallbacks(execute=True):
+			self.assertEqual(self.client.post('/checkout/', {'full_name': 'Buyer'}).status_code, 200)
+		self.assertEqual(popularity(), 1)
+
+	@override_settings(TYPEAHEAD_MAX_AGE=60)
+	def test_stale_index_is_served_while_another_request_rebuilds(self):
+		index = typeahead.index
+		index.built_at -= 120
+		stale_since = index.built_at
+		index._rebuilding.acquire()
+		try:
+			with self.assertNumQueries(0):
+				results = self.client.get('/api/typeahead/?q=nova').json()['results']
+			self.assertEqual([r['label'] for r in results], ['Nova Phone X'])
+			self.assertEqual(index.built_at, stale_since)
+		finally:
+			index._rebuilding.release()
+		self.client.get('/api/typeahead/?q=nova')
+		self.assertGreater(index.built_at, stale_since + 60)
+
+
+class MediaServingTests(TestCase):
+	def setUp(self):
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		self.root = tmp.name
+		self.storage = HashedMediaStorage(location=self.root)
+		self.name = self.storage.save('products/photo.jpg', ContentFile(bytes(range(256)) * 4))
+		with open(os.path.join(self.root, 'plain.jpg'), 'wb') as f:
+			f.write(b'x' * 10)
+		settings = override_settings(MEDIA_ROOT=self.root, MEDIA_SERVE_MODE='django')
+		settings.enable()
+		self.addCleanup(settings.disable)
+
+	def test_hashed_names_are_immutable_and_deduplicated(self):
+		self.assertRegex(self.name, r'^products/photo\.[0-9a-f]{12}\.jpg$')
+		self.assertEqual(self.storage.save('products/photo.jpg', ContentFile(bytes(range(256)) * 4)), self.name)
+		response = self.client.get(f'/media/{self.name}')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(b''.join(response.streaming_content), bytes(range(256)) * 4)
+		self.assertIn('immutable', response['Cache-Control'])
+		self.assertNotIn('immutable', self.client.get('/media/plain.jpg')['Cache-Control'])
+
+	def test_range_and_conditional_requests(self):
+		response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=256-259')
+		self.assertEqual(response.status_code, 206)
+		self.assertEqual(response['Content-Range'], 'bytes 256-259/1024')
+		self.assertEqual(b''.join(response.streaming_content), bytes(range(4)))
+		suffix = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=-2')
+		self.assertEqual(b''.join(suffix.streaming_content), bytes([254, 255]))
+		self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=5000-').status_code, 416)
+		# An invalid range is ignored: the whole file is sent.
+		invalid = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=5-3')
+		self.assertEqual(invalid.status_code, 200)
+		self.assertEqual(len(b''.join(invalid.streaming_content)), 1024)
+		etag = response['ETag']
+		self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_IF_NONE_MATCH='*').status_code, 304)
+		self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+	def test_proxy_modes_and_traversal(self):
+		with override_settings(MEDIA_SERVE_MODE='x-accel', MEDIA_ACCEL_PREFIX='/protected-media/'):
+			response = self.client.get('/media/plain.jpg')
+		self.assertEqual(response['X-Accel-Redirect'], '/protected-media/plain.jpg')
+		self.assertEqual(response.content, b'')
+		with override_settings(MEDIA_SERVE_MODE='x-sendfile'):
+			response = self.client.get('/media/plain.jpg')
+		self.assertEqual(response['X-Sendfile'], os.path.join(self.root, 'plain.jpg'))
+		self.assertEqual(self.client.get('/media/../settings.py').status_code, 400)
+		self.assertEqual(self.client.get('/media/products/').status_code, 404)
+
+
+SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SQL_IN_LIST_RE = re.compile(r'\((?:\?, )+\?\)')
+
+
+def _query_shape(sql: str) -> str:
+	return SQL_IN_LIST_RE.sub('(?)', SQL_LITERAL_RE.sub('?', sql))
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class PerformanceBudgetTests(TestCase):
+	"""Every route stays within its budget in store/perf_budgets.py."""
+
+	# Time budgets are opt-in; query counts alone need a single measured round.
+	TIMING = os.environ.get('PERF_BUDGETS_TIMING') == '1'
+	ROUNDS = 7 if TIMING else 1
+	CATEGORIES = ['Phones', 'Laptops', 'Audio', 'Cameras', 'Wearables', 'Gaming']
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = get_user_model().objects.create_user('shopper', password='pw')
+		cls.products = []
+		for name in cls.CATEGORIES:
+			category = Category.objects.create(name=name)
+			for i in range(20):
+				cls.products.append(Product.objects.create(
+					category=category, title=f'{name} Model {i}', description=f'A {name.lower()} for testing.',
+					price=Decimal('100.00') + i, discount_percent=i % 3 * 5,
+				))
+				inventory.set_stock(cls.products[-1].pk, 50)
+		ProductImage.objects.bulk_create(
+			ProductImage(product=product, image=f'seed/{product.slug}_g{n}.jpg') for product in cls.products for n in (1, 2)
+		)
+		for n in range(15):
+			cls.order = make_order(cls.user, cls.products[n:n + 3])
+		build_recommendations(full=True)
+
+	def setUp(self):
+		typeahead.index.build()
+
+	def _fill_cart(self) -> Cart:
+		cart, _ = Cart.objects.get_or_create(user=self.user, checked_out=False)
+		for product in self.products[:3]:
+			CartItem.objects.update_or_create(cart=cart, product=product, defaults={'quantity': 1})
+		return cart
+
+	def _line(self) -> int:
+		return self._fill_cart().items.order_by('id').values_list('id', flat=True)[0]
+
+	def _scenarios(self) -> dict:
+		"""URL name -> callable preparing state and returning (method, path, data, extra)."""
+		product = self.products[0]
+		return {
+			'home': lambda: ('get', '/', None, {}),
+			'category_detail': lambda: ('get', f'/category/{product.category.slug}/', None, {}),
+			'product_detail': lambda: ('get', f'/product/{product.slug}/', None, {}),
+			'cart_detail': lambda: (self._fill_cart(), ('get', '/cart/', None, {}))[1],
+			'add_to_cart': lambda: ('post', f'/cart/add/{product.slug}/', {'quantity': 1}, {}),
+			'update_cart_item': lambda: ('post', f'/cart/item/{self._line()}/update/', {'quantity': 2}, {}),
+			'typeahead_api': lambda: ('get', '/api/typeahead/', {'q': 'ph'}, {}),
+			'cart_api_add': lambda: ('post', f'/api/cart/add/{product.slug}/', {'quantity': 1}, {}),
+			'cart_api_update': lambda: ('post', f'/api/cart/item/{self._line()}/', {'quantity': 2}, {}),
+			'cart_api_remove': lambda: ('post', f'/api/cart/item/{self._line()}/remove/', None, {}),
+			'cart_api_batch': lambda: ('post', '/api/cart/batch/', json.dumps({'lines': [
+				{'id': item_id, 'quantity': 2} for item_id in self._fill_cart().items.values_list('id', flat=True)
+			]}), {'content_type': 'application/json'}),
+			'checkout': lambda: (self._fill_cart(), ('post', '/checkout/', {'full_name': 'Shopper'}, {}))[1],
+			'stripe_checkout': lambda: (self._fill_cart(), ('post', '/checkout/stripe/', {'full_name': 'Shopper'}, {}))[1],
+			'checkout_success': lambda: ('get', '/checkout/success/', None, {}),
+			'order_list': lambda: ('get', '/orders/', None, {}),
+			'order_detail': lambda: ('get', f'/orders/{self.order.id}/', None, {}),
+			'register': lambda: ('get', '/register/', None, {}),
+			'login': lambda: ('get', '/login/', None, {}),
+			'logout': lambda: ('get', '/logout/', None, {}),
+			'product_chat_api': lambda: ('post', '/api/chat/', {'message': 'phones model'}, {}),
+		}
+
+	def _measure(self, prepare):
+		"""Warm the route once, then time ROUNDS requests; returns the fastest and the last one's queries."""
+		timings = []
+		for round_ in range(self.ROUNDS + 1):
+			self.client.force_login(self.user)
+			method, path, data, extra = prepare()
+			with CaptureQueriesContext(connection) as queries:
+				start = perf_counter()
+				response = getattr(self.client, method)(path, data, **extra)
+				elapsed = perf_counter() - start
+			self.assertLess(response.status_code, 400, f'{method.upper()} {path}')
+			if round_:
+				timings.append(elapsed)
+		return min(timings), queries.captured_queries
+
+	def _measure_ws_chat(self):
+		application = AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+		async def chat():
+			communicator = WebsocketCommunicator(application, '/ws/chat/')
+			connected, _ = await communicator.connect()
+			self.assertTrue(connected)
+			await communicator.receive_json_from()
+			await communicator.send_json_to({'message': 'phones model'})
+			reply = await communicator.receive_json_from()
+			await communicator.disconnect()
+			return reply
+
+		timings = []
+		for round_ in range(self.ROUNDS + 1):
+			with CaptureQueriesContext(connection) as queries:
+				start = perf_counter()
+				reply = async_to_sync(chat)()
+				elapsed = perf_counter() - start
+			self.assertIn('Here are some matches', reply['message'])
+			if round_:
+				timings.append(elapsed)
+		return min(timings), queries.captured_queries
+
+	def _violations(self, name: str, budget: dict, elapsed: float, baseline: float, queries: list) -> list:
+		seen = set()
+		duplicates = set()
+		for i, query in enumerate(queries):
+			shape = _query_shape(query['sql'])
+			if shape in seen:
+				duplicates.add(i)
+			seen.add(shape)
+		problems = []
+		if len(queries) > budget['queries']:
+			problems.append(f"{len(queries)} queries > budget {budget['queries']}")
+		if len(duplicates) > budget['duplicates']:
+			problems.append(f"{len(duplicates)} duplicate queries > budget {budget['duplicates']}")
+		ratio = elapsed / baseline
+		if self.TIMING and ratio > budget['time']:
+			problems.append(f"{elapsed * 1000:.2f} ms is {ratio:.1f}x baseline > budget {budget['time']}x")
+		if not problems:
+			return []
+		listing = '\n'.join(
+			f"  {'*' if i in duplicates else ' '}{i + 1:3}. {query['sql']}" for i, query in enumerate(queries)
+		)
+		return [f"{name}: {'; '.join(problems)}\n{listing}"]
+
+	def test_every_route_has_a_budget(self):
+		names = {pattern.name for pattern in store_urlpatterns} | {'ws_chat'}
+		self.assertEqual(names - set(perf_budgets.BUDGETS), set(), 'routes without a budget')
+		self.assertEqual(set(self._scenarios()) | {'ws_chat'}, names, 'routes without a scenario')
+
+	def test_routes_stay_within_budget(self):
+		results = {name: self._measure(prepare) for name, prepare in self._scenarios().items()}
+		results['ws_chat'] = self._measure_ws_chat()
+		baseline = results[perf_budgets.BASELINE][0]
+		failures = []
+		for name, (elapsed, queries) in results.items():
+			failures += self._violations(name, perf_budgets.BUDGETS[name], elapsed, baseline, queries)
+		if os.environ.get('PERF_BUDGETS_REPORT'):
+			for name, (elapsed, queries) in results.items():
+				shapes = [_query_shape(q['sql']) for q in queries]
+				print(f'{name:<18} {len(queries):3} queries {len(shapes) - len(set(shapes)):3} dup {elapsed / baseline:6.2f}x')
+		if failures:
+			self.fail('performance budgets exceeded (* marks duplicates):\n' + '\n\n'.join(failures))
+
+
+@override_settings(INVENTORY_SHARDS=4)
+class InventoryTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = get_user_model().objects.create_user('buyer', password='pw')
+		category = Category.objects.create(name='Consoles')
+		cls.product = Product.objects.create(category=category, title='Console', description='-', price=Decimal('300.00'))
+
+	def test_take_spans_shards_and_never_oversells(self):
+		inventory.set_stock(self.product.pk, 10)
+		self.assertEqual(sorted(StockShard.objects.values_list('quantity', flat=True)), [2, 2, 3, 3])
+		inventory.take(self.product.pk, 3)
+		inventory.take(self.product.pk, 6)
+		self.assertEqual(inventory.available(self.product.pk), 1)
+		with self.assertRaises(inventory.OutOfStock):
+			inventory.take(self.product.pk, 2)
+		self.assertEqual(inventory.available(self.product.pk), 1)
+		self.assertTrue(Product.objects.get(pk=self.product.pk).in_stock)
+		inventory.take(self.product.pk, 1)
+		self.assertFalse(inventory.with_available(Product.objects).get(pk=self.product.pk).in_stock)
+
+	def test_compact_evens_out_shards(self):
+		inventory.set_stock(self.product.pk, 8)
+		StockShard.objects.filter(shard__in=[0, 1]).update(quantity=0)
+		inventory.add_stock(self.product.pk, 5)
+		with override_settings(INVENTORY_SHARDS=3):
+			self.assertEqual(inventory.compact(), 1)
+			self.assertEqual(inventory.compact(), 0)
+		self.assertEqual(list(StockShard.objects.order_by('shard').values_list('quantity', flat=True)), [3, 3, 3])
+
+	def test_admin_save_during_sales_keeps_them_sold(self):
+		inventory.set_stock(self.product.pk, 10)
+		admin_user = get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw')
+		self.client.force_login(admin_user)
+		url = f'/admin/store/product/{self.product.pk}/change/'
+		self.assertContains(self.client.get(url), 'stock_change')
+		# Seven units sell while the change form is open.
+		inventory.take(self.product.pk, 7)
+		data = {
+			'category': self.product.category_id, 'title': 'Console', 'slug': self.product.slug, 'description': '-',
+			'price': '280.00', 'discount_percent': 0, 'is_active': 'on', 'stock_change': 0,
+			'images-TOTAL_FORMS': 0, 'images-INITIAL_FORMS': 0, 'images-MIN_NUM_FORMS': 0, 'images-MAX_NUM_FORMS': 1000,
+		}
+		self.assertEqual(self.client.post(url, data).status_code, 302)
+		self.assertEqual(inventory.available(self.product.pk), 3)
+		self.assertEqual(self.client.post(url, {**data, 'stock_change': 5}).status_code, 302)
+		self.assertEqual(inventory.available(self.product.pk), 8)
+		self.assertEqual(self.client.post(url, {**data, 'stock_change': -9}).status_code, 200)
+		self.assertEqual(inventory.available(self.product.pk), 8)
+
+	def test_checkout_takes_stock_without_touching_the_product(self):
+		inventory.set_stock(self.product.pk, 2)
+		updated_at = Product.objects.get(pk=self.product.pk).updated_at
+		self.client.force_login(self.user)
+		self.client.post(f'/api/cart/add/{self.product.slug}/', {'quantity': 3})
+		response = self.client.post('/checkout/', {'full_name': 'Buyer'})
+		self.assertEqual(response.status_code, 409)
+		self.assertContains(response, 'Only 2 of Console left', status_code=409)
+		self.assertFalse(Order.objects.exists())
+		line = CartItem.objects.get()
+		self.client.post(f'/api/cart/item/{line.id}/', {'quantity': 2})
+		self.assertEqual(self.client.post('/checkout/', {'full_name': 'Buyer'}).status_code, 200)
+		self.assertEqual(inventory.available(self.product.pk), 0)
+		self.assertEqual(Product.objects.get(pk=self.product.pk).updated_at, updated_at)
+		reply = self.client.post('/api/chat/', {'message': 'console'}).json()['reply']
+		self.assertIn('Out of stock', reply)
+
+
+class CatalogSnapshotTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.category = Category.objects.create(name='Tablets')
+		cls.tab = Product.objects.create(
+			category=cls.category, title='Slate Tab', description='-', price=Decimal('200.00'), discount_percent=25,
+		)
+		inventory.set_stock(cls.tab.pk, 3)
+
+	def test_records_are_compact_and_precomputed(self):
+		record = catalog.snapshot().product_by_id[self.tab.pk]
+		self.assertFalse(hasattr(record, '__dict__'))
+		self.assertEqual(record.discounted_price, self.tab.discounted_price)
+		self.assertEqual(record.category.name, 'Tablets')
+		self.assertEqual(catalog.snapshot().category_by_slug['tablets'].id, self.category.id)
+
+	def test_signals_reload_the_snapshot(self):
+		first = catalog.snapshot()
+		self.assertIs(catalog.snapshot(), first)
+		self.tab.title = 'Slate Tab 2'
+		self.tab.save()
+		second = catalog.snapshot()
+		self.assertIsNot(second, first)
+		self.assertEqual(second.product_by_id[self.tab.pk].title, 'Slate Tab 2')
+		self.assertEqual(first.product_by_id[self.tab.pk].title, 'Slate Tab')
+		self.category.is_active = False
+		self.category.save()
+		self.assertEqual(self.client.get('/category/tablets/').status_code, 404)
+
+	def test_listing_and_chat_serve_from_snapshot(self):
+		catalog.snapshot()
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(f'/category/{self.category.slug}/')
+		self.assertFalse([q['sql'] for q in queries if 'store_product' in q['sql'] or 'store_category' in q['sql']])
+		self.assertEqual([p.id for p in response.context['products']], [self.tab.pk])
+		reply = self.client.post('/api/chat/', {'message': 'slate'}).json()['reply']
+		self.assertEqual(reply, 'Here are some matches: Slate Tab ($150.00) - In stock in Tablets.')
+		reply = self.client.post('/api/chat/', {'message': 'tablets'}).json()['reply']
+		self.assertIn('1 product(s) in Tablets', reply)
+
+
+class RecommendationTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = get_user_model().objects.create_user('buyer', password='pw')
+		category = Category.objects.create(name='Kitchen')
+		cls.products = [
+			Product.objects.create(category=category, title=f'Item {i}', description='-', price=Decimal('10.00'))
+			for i in range(6)
+		]
+
+	def _order(self, *indexes, status=Order.PAID):
+		return make_order(self.user, [self.products[i] for i in indexes], status=status)
+
+	def _rows(self):
+		return (
+			sorted(ProductPairCount.objects.values_list('product_id', 'other_id', 'count')),
+			sorted(ProductRecommendation.objects.values_list('product_id', 'recommended_id', 'score', 'rank')),
+		)
+
+	def test_incremental_builds_match_a_full_rebuild(self):
+		self._order(0, 1, 2)
+		self._order(1, 2)
+		build_recommendations(k=2)
+		self._order(0, 1, 3)
+		self._order(2, 4, status=Order.CANCELLED)
+		self._order(3, 4, 5)
+		build_recommendations(k=2)
+		incremental = self._rows()
+		self.assertTrue(incremental[1])
+		build_recommendations(full=True, k=2)
+		self.assertEqual(self._rows(), incremental)
+
+	def test_sparse_and_python_counters_agree(self):
+		if recommendations.sparse is None:
+			self.skipTest('SciPy is not installed')
+		baskets = [{1, 2, 3}, {2, 3}, {7, 1}, {3, 9, 2, 1}, {40, 2}]
+		self.assertEqual(
+			recommendations._count_pairs_sparse(baskets, chunk_size=2), recommendations._count_pairs_python(baskets),
+		)
+
+	def test_product_page_reads_recommendations_in_one_query(self):
+		product = self.products[0]
+		url = f'/product/{product.slug}/'
+		self.client.get(url)
+		with CaptureQueriesContext(connection) as without:
+			self.client.get(url)
+		for i in range(1, 5):
+			self._order(0, i)
+		build_recommendations()
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(url)
+		self.assertEqual(len(response.context['recommendations']), 4)
+		# Four recommended products cost no more queries than none.
+		self.assertEqual(len(queries), len(without))
+		self.assertEqual(len([q for q in queries if '"store_productrecommendation"' in q['sql']]), 1)
+
+
+class SalesRollupTests(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = get_user_model().objects.create_user('buyer', password='pw')
+		cls.audio = Category.objects.create(name='Audio')
+		cls.video = Category.objects.create(name='Video')
+		cls.speaker = Product.objects.create(category=cls.audio, title='Speaker', description='-', price=Decimal('50.00'))
+		cls.mic = Product.objects.create(category=cls.audio, title='Mic', description='-', price=Decimal('20.00'))
+		cls.tv = Product.objects.create(category=cls.video, title='TV', description='-', price=Decimal('400.00'))
+
+	def _order(self, hours_ago, lines, status=Order.PAID):
+		return make_order(self.user, lines, status=status, created_at=timezone.now() - timedelta(hours=hours_ago))
+
+	def _rows(self):
+		return (
+			sorted(ProductSalesRollup.objects.values_list('period', 'bucket', 'product_id', 'revenue', 'units', 'orders')),
+			sorted(CategorySalesRollup.objects.values_list('period', 'bucket', 'category_id', 'revenue', 'units', 'orders')),
+		)
+
+	def test_incremental_runs_match_a_rebuild(self):
+		self._order(30, [(self.speaker, 1), (self.tv, 1)])
+		self._order(5, [(self.mic, 2)])
+		analytics.update_rollups(chunk_size=1)
+		self._order(5, [(self.speaker, 3), (self.mic, 1)])
+		self._order(1, [(self.tv, 2)])
+		call_command('update_sales_rollups', chunk_size=1, stdout=StringIO())
+		incremental = self._rows()
+		call_command('backfill_sales_rollups', chunk_size=3, stdout=StringIO())
+		self.assertEqual(self._rows(), incremental)
+		call_command('backfill_sales_rollups', '--resume', stdout=StringIO())
+		self.assertEqual(self._rows(), incremental)
+
+	def test_orders_are_counted_once_across_lines_and_chunks(self):
+		for _ in range(3):
+			self._order(2, [(self.speaker, 1), (self.mic, 1)])
+		analytics.update_rollups(chunk_size=2)
+		day = CategorySalesRollup.objects.get(period=SalesRollup.DAY, category=self.audio)
+		self.assertEqual((day.orders, day.units, day.revenue), (3, 6, Decimal('210.00')))
+
+	def test_cancelled_orders_are_excluded(self):
+		self._order(2, [(self.tv, 1)])
+		self._order(2, [(self.tv, 5)], status=Order.CANCELLED)
+		analytics.update_rollups()
+		self.assertEqual(
+			list(ProductSalesRollup.objects.filter(period=SalesRollup.DAY).values_list('units', 'orders')), [(1, 1)],
+		)
+
+	def test_overlapping_runs_do_not_fold_orders_twice(self):
+		for hours in (3, 2, 1):
+			self._order(hours, [(self.speaker, 1)])
+		nested = []
+
+		def progress(done, total):
+			# A second run starts while the first is between chunks.
+			if not nested:
+				nested.append(analytics.update_rollups(chunk_size=1))
+
+		analytics.update_rollups(chunk_size=1, progress=progress)
+		self.assertEqual(
+			list(CategorySalesRollup.objects.filter(period=SalesRollup.DAY).values_list('units', 'orders')), [(3, 3)],
+		)
+
+	@override_settings(SALES_ROLLUP_LAG=120)
+	def test_order_committing_after_a_newer_one_is_not_skipped(self):
+		self._order(2, [(self.mic, 1)])
+		# Order N+1 commits first; order N's checkout is still running, so its id is taken but not visible.
+		late_id = make_order(self.user, [self.tv]).pk
+		newer = make_order(self.user, [self.speaker], status=Order.PAID)
+		Order.objects.filter(pk=late_id).delete()
+		analytics.update_rollups()
+		self.assertEqual(JobWatermark.objects.get(name=analytics.WATERMARK_NAME).last_id, late_id - 1)
+		make_order(self.user, [self.tv], status=Order.PAID, id=late_id)
+		Order.objects.filter(pk__in=[late_id, newer.pk]).update(created_at=timezone.now() - timedelta(minutes=5))
+		analytics.update_rollups()
+		self.assertEqual(
+			sorted(ProductSalesRollup.objects.filter(period=SalesRollup.DAY).values_list('product__title', 'units')),
+			[('Mic', 1), ('Speaker', 1), ('TV', 1)],
+		)
+
+	def test_dashboard_reads_only_rollups(self):
+		self._order(2, [(self.speaker, 1)])
+		analytics.update_rollups()
+		self.client.force_login(get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw'))
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get('/admin/store/categorysalesrollup/')
+		self.assertEqual(response.status_code, 200)
+		self.assertContains(response, 'Speaker')
+		raw = [q['sql'] for q in queries if re.search(r'"store_order(item)?"', q['sql'])]
+		self.assertEqual(raw, [])
+
+
+@override_settings(RATE_LIMIT_ENABLED=True)
+class RateLimitTests(TestCase):
+	def setUp(self):
+		cache.clear()
+
+	@override_settings(RATE_LIMITS={'chat': {'ip': '2/m'}})
+	def test_exhausted_bucket_answers_429_with_retry_after(self):
+		for _ in range(2):
+			self.assertEqual(self.client.post('/api/chat/', {'message': 'hi'}).status_code, 200)
+		response = self.client.post('/api/chat/', {'message': 'hi'})
+		self.assertEqual(response.status_code, 429)
+		self.assertTrue(1 <= int(response['Retry-After']) <= 30)
+
+	@override_settings(RATE_LIMITS={'probe': {'ip': '1/m'}})
+	def test_decorator_limits_async_views(self):
+		@ratelimit.rate_limit('probe')
+		async def view(request):
+			return JsonResponse({'ok': True})
+
+		self.assertTrue(iscoroutinefunction(view))
+		request = RequestFactory().get('/probe/')
+		self.assertEqual(async_to_sync(view)(request).status_code, 200)
+		self.assertEqual(async_to_sync(view)(request).status_code, 429)
+
+	def test_refused_request_leaves_later_scopes_untouched(self):
+		rules = {'ip': '1/m', 'user': '2/m'}
+		self.assertFalse(ratelimit._check('probe', {'ip': 'a', 'user': 1}, rules))
+		self.assertTrue(ratelimit._check('probe', {'ip': 'a', 'user': 1}, rules))
+		# The refusal above did not spend the user's second token.
+		self.assertFalse(ratelimit._check('probe', {'ip': 'b', 'user': 1}, rules))
+
+	@override_settings(RATE_LIMITS={'chat': {'ip': '1/m'}})
+	def test_chat_socket_closes_with_4429_when_limited(self):
+		application = AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+		async def chat():
+			communicator = WebsocketCommunicator(application, '/ws/chat/')
+			communicator.scope['client'] = ['10.0.0.1', 5000]
+			connected, _ = await communicator.connect()
+			self.assertTrue(connected)
+			await communicator.receive_json_from()
+			await communicator.send_json_to({'message': 'phones'})
+			await communicator.receive_json_from()
+			await communicator.send_json_to({'message': 'laptops'})
+			closed = await communicator.receive_output()
+			await communicator.wait()
+			return closed
+
+		self.assertEqual(async_to_sync(chat)(), {'type': 'websocket.close', 'code': ratelimit.RATE_LIMITED_CLOSE_CODE})
+
+
+class AsyncStoreUrls:
+	"""store/urls.py as routed with STORE_ASYNC_VIEWS=1."""
+	urlpatterns = [
+		path('', views.ahome, name='home'),
+		path('category/<slug:slug>/', views.acategory_detail, name='category_detail'),
+		path('product/<slug:slug>/', views.aproduct_detail, name='product_detail'),
+		path('api/chat/', views.aproduct_chat_api, name='product_chat_api'),
+	] + [
+		pattern for pattern in store_urlpatterns
+		if pattern.name not in {'home', 'category_detail', 'product_detail', 'product_chat_api'}
+	]
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class AsyncViewTests(TestCase):
+	"""The async catalog views answer like their sync counterparts."""
+
+	@classmethod
+	def setUpTestData(cls):
+		phones = Category.objects.create(name='Phones')
+		Category.objects.create(name='Hidden', is_active=False)
+		cls.nova = Product.objects.create(category=phones, title='Nova Phone', description='-', price=Decimal('300.00'))
+		Product.objects.create(category=phones, title='Old Phone', description='-', price=Decimal('90.00'), is_active=False)
+		inventory.set_stock(cls.nova.pk, 3)
+
+	def _both(self, method, path, data=None):
+		sync = getattr(self.client, method)(path, data)
+		with override_settings(ROOT_URLCONF=AsyncStoreUrls):
+			response = async_to_sync(getattr(self.async_client, method))(path, data)
+		return sync, response
+
+	def test_pages_match_the_sync_views(self):
+		pages = {
+			'/': 200, '/?q=nova': 200, '/category/phones/': 200, '/category/hidden/': 404, '/category/none/': 404,
+			'/product/nova-phone/': 200, '/product/old-phone/': 404, '/product/none/': 404,
+		}
+		for url, status in pages.items():
+			with self.subTest(url=url):
+				sync, response = self._both('get', url)
+				self.assertEqual((sync.status_code, response.status_code), (status, status))
+				if status == 200 and 'products' in sync.context:
+					self.assertEqual(
+						[p.id for p in response.context['products']], [p.id for p in sync.context['products']],
+					)
+		sync, response = self._both('get', '/product/nova-phone/')
+		self.assertEqual(response.context['product'].pk, sync.context['product'].pk)
+		self.assertEqual(response.context['product'].available, 3)
+
+	def test_chat_matches_the_sync_view(self):
+		for message in ['', 'hello', 'nova', 'phones', 'nothing like it']:
+			with self.subTest(message=message):
+				sync, response = self._both('post', '/api/chat/', {'message': message})
+				self.assertEqual(response.status_code, 200)
+				self.assertEqual(response.json(), sync.json())
+		sync, response = self._both('get', '/api/chat/')
+		self.assertEqual((sync.status_code, response.status_code), (405, 405))
+
+
+class WarmupTests(TestCase):
+	def test_warmup_primes_the_worker_and_closes_its_connections(self):
+		with mock.patch.object(warmup.connections, 'close_all') as close_all:
+			stats = warmup.warmup()
+		self.assertGreater(stats['templates'], 0)
+		self.assertGreater(stats['urls'], 0)
+		self.assertTrue(typeahead.index.is_built)
+		close_all.assert_called_once_with()
+
+	def test_production_settings_require_a_secret_key(self):
+		environ = {k: v for k, v in os.environ.items() if k != 'DJANGO_SECRET_KEY'}
+		try:
+			with mock.patch.dict(os.environ, environ, clear=True):
+				sys.modules.pop('ecommerce.settings_production', None)
+				with self.assertRaises(ImproperlyConfigured):
+					importlib.import_module('ecommerce.settings_production')
+			with mock.patch.dict(os.environ, {**environ, 'DJANGO_SECRET_KEY': 'prod-key'}, clear=True):
+				production = importlib.import_module('ecommerce.settings_production')
+			self.assertEqual((production.SECRET_KEY, production.DEBUG), ('prod-key', False))
+		finally:
+			sys.modules.pop('ecommerce.settings_production', None)
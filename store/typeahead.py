@@ -0,0 +1,282 @@
+"""In-process typeahead over active product titles and category names.
+
+Every word start of a title or name is a key in one sorted array, so the
+matches of a keystroke are one ``bisect`` range and never touch the database.
+Matches are ranked by popularity (number of order lines for products, summed
+over their products for categories); rankings of prefixes with many matches
+are memoized until the entries behind them change. Signals in
+``store.signals`` keep the index current in this worker; changes made by other workers are picked up when
+the index is older than ``TYPEAHEAD_MAX_AGE`` seconds and rebuilds. One request
+rebuilds it while the others keep searching the stale copy; changes signalled
+during a rebuild are replayed onto the new index.
+"""
+import re
+import sys
+import threading
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from time import monotonic
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Category, OrderItem, Product
+
+PRODUCT = 'product'
+CATEGORY = 'category'
+TOP_K = 8
+# Prefixes matching more keys than this keep their ranked top-K memoized.
+MEMO_MIN_MATCHES = 64
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+	return ' '.join(WORD_RE.findall(text.casefold()))
+
+
+def _rank(suggestion):
+	return (-suggestion.popularity, suggestion.label)
+
+
+def _keys(label: str):
+	"""``'Nova Phone X'`` -> ``['nova phone x', 'phone x', 'x']``."""
+	words = normalize(label).split()
+	return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class Suggestion:
+	__slots__ = ('kind', 'pk', 'label', 'url', 'popularity', 'category_id')
+
+	def __init__(self, kind, pk, label, url, popularity=0, category_id=None):
+		self.kind = kind
+		self.pk = pk
+		self.label = label
+		self.url = url
+		self.popularity = popularity
+		self.category_id = category_id
+
+	def as_json(self) -> dict:
+		return {'type': self.kind, 'label': self.label, 'url': self.url}
+
+
+class TypeaheadIndex:
+	def __init__(self):
+		# Sorted (key, kind, pk) tuples. Writers build a new list and swap it in, so
+		# readers can scan whichever list they picked up without locking.
+		self._keys = []
+		self._entries = {}
+		self._top = {}
+		self._lock = threading.Lock()
+		# Held while building; a request finding it taken keeps serving the stale index.
+		self._rebuilding = threading.Lock()
+		# While a build reads the database, changes are applied to the current index
+		# and also recorded here, to be replayed onto the new one before it is published.
+		self._pending = None
+		self._pending_sales = None
+		self.built_at = None
+
+	@property
+	def is_built(self) -> bool:
+		return self.built_at is not None
+
+	def build(self):
+		with self._rebuilding:
+			self._build()
+
+	def _build(self):
+		with self._lock:
+			self._pending = []
+		try:
+			keys = self._load()
+		finally:
+			with self._lock:
+				self._pending = self._pending_sales = None
+		# Rank the one- and two-letter prefixes now; they have the most matches.
+		for prefix in {key[:n] for key, _, _ in keys for n in (1, 2)}:
+			self.search(prefix)
+
+	def _load(self):
+		popularity = dict(
+			OrderItem.objects.values('product_id').annotate(lines=Count('id')).values_list('product_id', 'lines')
+		)
+		# Sales reported from here on are replayed onto the new index. One whose
+		# order committed while the query above ran is missed until the next build.
+		with self._lock:
+			self._pending_sales = []
+		entries = {}
+		category_popularity = {}
+		for pk, title, slug, category_id in Product.objects.filter(is_active=True).values_list('id', 'title', 'slug', 'category_id'):
+			lines = popularity.get(pk, 0)
+			entries[(PRODUCT, pk)] = Suggestion(PRODUCT, pk, title, f'/product/{slug}/', lines, category_id)
+			category_popularity[category_id] = category_popularity.get(category_id, 0) + lines
+		for pk, name, slug in Category.objects.filter(is_active=True).values_list('id', 'name', 'slug'):
+			entries[(CATEGORY, pk)] = Suggestion(CATEGORY, pk, name, f'/category/{slug}/', category_popularity.get(pk, 0))
+		keys = sorted(
+			(key, kind, pk)
+			for (kind, pk), suggestion in entries.items()
+			for key in _keys(suggestion.label)
+		)
+		with self._lock:
+			self._swap(keys, entries)
+			for change, args in self._pending:
+				change(*args)
+			for product_id in self._pending_sales:
+				self._add_sale(product_id)
+			self.built_at = monotonic()
+			return self._keys
+
+	def _swap(self, keys, entries, changed=None):
+		"""Publish a new key array, keeping memoized rankings no changed key can affect."""
+		if changed is None:
+			top = {}
+		else:
+			stale = {key[:n] for key in changed for n in range(1, len(key) + 1)}
+			top = {prefix: (keys, ranked) for prefix, (_, ranked) in self._top.items() if prefix not in stale}
+		self._keys, self._entries, self._top = keys, entries, top
+
+	def ensure_fresh(self):
+		"""Build the index on first use; later, rebuild it once it is stale.
+
+		Only one caller builds at a time. While a stale index is being rebuilt,
+		everyone else keeps searching the old one instead of waiting.
+		"""
+		if self.built_at is None:
+			with self._rebuilding:
+				if self.built_at is None:
+					self._build()
+			return
+		if monotonic() - self.built_at <= getattr(settings, 'TYPEAHEAD_MAX_AGE', 300):
+			return
+		if not self._rebuilding.acquire(blocking=False):
+			return
+		try:
+			if monotonic() - self.built_at > getattr(settings, 'TYPEAHEAD_MAX_AGE', 300):
+				self._build()
+		finally:
+			self._rebuilding.release()
+
+	def search(self, query: str, limit: int = TOP_K) -> list:
+		prefix = normalize(query)
+		if not prefix:
+			return []
+		keys, entries = self._keys, self._entries
+		memo = self._top.get(prefix)
+		# A memo computed from an older key array (racing a writer) is ignored.
+		if memo is not None and memo[0] is keys and limit <= TOP_K:
+			return memo[1][:limit]
+		start = bisect_left(keys, (prefix,))
+		end = bisect_left(keys, (prefix + '\U0010ffff',), start)
+		refs = {(kind, pk) for _, kind, pk in keys[start:end]}
+		ranked = nsmallest(max(limit, TOP_K), (entries[ref] for ref in refs if ref in entries), key=_rank)
+		if end - start > MEMO_MIN_MATCHES:
+			self._top[prefix] = (keys, ranked[:TOP_K])
+		return ranked[:limit]
+
+	def upsert(self, suggestion: Suggestion):
+		with self._lock:
+			if self._pending is not None:
+				self._pending.append((self._upsert, (suggestion,)))
+			self._upsert(suggestion)
+
+	def _upsert(self, suggestion: Suggestion):
+		ref = (suggestion.kind, suggestion.pk)
+		keys, entries = list(self._keys), dict(self._entries)
+		changed = _keys(suggestion.label)
+		old = entries.get(ref)
+		if old is not None:
+			suggestion.popularity = old.popularity
+			self._remove_keys(keys, old)
+			changed += _keys(old.label)
+		entries[ref] = suggestion
+		for key in _keys(suggestion.label):
+			insort(keys, (key, suggestion.kind, suggestion.pk))
+		self._swap(keys, entries, changed)
+
+	def remove(self, kind: str, pk: int):
+		with self._lock:
+			if self._pending is not None:
+				self._pending.append((self._remove, (kind, pk)))
+			self._remove(kind, pk)
+
+	def _remove(self, kind: str, pk: int):
+		old = self._entries.get((kind, pk))
+		if old is None:
+			return
+		keys, entries = list(self._keys), dict(self._entries)
+		self._remove_keys(keys, old)
+		del entries[(kind, pk)]
+		self._swap(keys, entries, _keys(old.label))
+
+	@staticmethod
+	def _remove_keys(keys: list, suggestion: Suggestion):
+		for key in _keys(suggestion.label):
+			item = (key, suggestion.kind, suggestion.pk)
+			i = bisect_left(keys, item)
+			if i < len(keys) and keys[i] == item:
+				del keys[i]
+
+	def add_sale(self, product_id: int):
+		with self._lock:
+			if self._pending_sales is not None:
+				self._pending_sales.append(product_id)
+			self._add_sale(product_id)
+
+	def _add_sale(self, product_id: int):
+		product = self._entries.get((PRODUCT, product_id))
+		if product is None:
+			return
+		product.popularity += 1
+		self._forget_rankings(product)
+		category = self._entries.get((CATEGORY, product.category_id))
+		if category is not None:
+			category.popularity += 1
+			self._forget_rankings(category)
+
+	def _forget_rankings(self, suggestion: Suggestion):
+		for key in _keys(suggestion.label):
+			for n in range(1, len(key) + 1):
+				self._top.pop(key[:n], None)
+
+	def memory_report(self) -> dict:
+		"""Approximate bytes held by the index (containers, tuples, strings, records)."""
+		keys, entries = self._keys, self._entries
+		key_bytes = sys.getsizeof(keys) + sum(sys.getsizeof(t) + sys.getsizeof(t[0]) for t in keys)
+		entry_bytes = sys.getsizeof(entries) + sum(
+			sys.getsizeof(ref) + sys.getsizeof(s) + sys.getsizeof(s.label) + sys.getsizeof(s.url)
+			for ref, s in entries.items()
+		)
+		top = self._top
+		memo_bytes = sys.getsizeof(top) + sum(
+			sys.getsizeof(prefix) + sys.getsizeof(memo) + sys.getsizeof(memo[1]) for prefix, memo in top.items()
+		)
+		return {
+			'entries': len(entries),
+			'keys': len(keys),
+			'memoized_prefixes': len(top),
+			'key_bytes': key_bytes,
+			'entry_bytes': entry_bytes,
+			'memo_bytes': memo_bytes,
+			'total_bytes': key_bytes + entry_bytes + memo_bytes,
+		}
+
+
+index = TypeaheadIndex()
+
+
+def search(query: str, limit: int = TOP_K) -> list:
+	index.ensure_fresh()
+	return [suggestion.as_json() for suggestion in index.search(query, limit)]
+
+
+def product_changed(product: Product):
+	if product.is_active:
+		index.upsert(Suggestion(PRODUCT, product.pk, product.title, f'/product/{product.slug}/', category_id=product.category_id))
+	else:
+		index.remove(PRODUCT, product.pk)
+
+
+def category_changed(category: Category):
+	if category.is_active:
+		index.upsert(Suggestion(CATEGORY, category.pk, category.name, f'/category/{category.slug}/'))
+	else:
+		index.remove(CATEGORY, category.pk)
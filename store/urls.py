@@ -1,18 +1,28 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+async_views = getattr(settings, 'STORE_ASYNC_VIEWS', False)
+
 urlpatterns = [
-	path('', views.home, name='home'),
-	path('category/<slug:slug>/', views.category_detail, name='category_detail'),
-	path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+	path('', views.ahome if async_views else views.home, name='home'),
+	path('category/<slug:slug>/', views.acategory_detail if async_views else views.category_detail, name='category_detail'),
+	path('product/<slug:slug>/', views.aproduct_detail if async_views else views.product_detail, name='product_detail'),
 	path('cart/', views.cart_detail, name='cart_detail'),
 	path('cart/add/<slug:slug>/', views.add_to_cart, name='add_to_cart'),
 	path('cart/item/<int:item_id>/update/', views.update_cart_item, name='update_cart_item'),
+	path('api/typeahead/', views.typeahead_api, name='typeahead_api'),
+	path('api/cart/add/<slug:slug>/', views.cart_api_add, name='cart_api_add'),
+	path('api/cart/item/<int:item_id>/', views.cart_api_update, name='cart_api_update'),
+	path('api/cart/item/<int:item_id>/remove/', views.cart_api_remove, name='cart_api_remove'),
+	path('api/cart/batch/', views.cart_api_batch, name='cart_api_batch'),
 	path('checkout/', views.checkout, name='checkout'),
 	path('checkout/stripe/', views.stripe_checkout, name='stripe_checkout'),
 	path('checkout/success/', views.checkout_success, name='checkout_success'),
+	path('orders/', views.order_list, name='order_list'),
+	path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
 	path('register/', views.register_view, name='register'),
 	path('login/', views.login_view, name='login'),
 	path('logout/', views.logout_view, name='logout'),
-	path('api/chat/', views.product_chat_api, name='product_chat_api'),
+	path('api/chat/', views.aproduct_chat_api if async_views else views.product_chat_api, name='product_chat_api'),
 ]
\ No newline at end of file
@@ -1,98 +1,285 @@
+import json
+from decimal import Decimal
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from django.http import JsonResponse, HttpRequest, HttpResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.http import Http404, JsonResponse, HttpRequest, HttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.views.decorators.http import require_POST
+from django.db import transaction
 from django.db.models import Q
 
-from .models import Category, Product, Cart, CartItem, Order, OrderItem
+from .models import Product, Cart, CartItem, Order, OrderItem
+from .context_processors import aglobal_context
+from .ratelimit import rate_limit
+from .recommendations import arecommendations_for, recommendations_for
+from . import catalog, inventory, typeahead
 from django.conf import settings
-
-try:
-	import stripe
+from django.utils.dateparse import parse_datetime
+
+
+@lru_cache(maxsize=None)
+def _get_stripe():
+	"""Import and configure stripe on first use, only when payments are configured."""
+	if not (settings.STRIPE_PUBLIC_KEY and settings.STRIPE_SECRET_KEY):
+		return None
+	try:
+		import stripe
+	except ImportError:
+		return None
 	stripe.api_key = settings.STRIPE_SECRET_KEY
-except Exception:
-	stripe = None
+	return stripe
 
 
 def _get_or_create_cart(request: HttpRequest) -> Cart:
+	# Kept on the request so the view and the global context processor share one lookup.
+	cart = getattr(request, '_cart', None)
+	if cart is not None and not cart.checked_out:
+		return cart
 	if request.user.is_authenticated:
 		cart, _ = Cart.objects.get_or_create(user=request.user, checked_out=False)
-		return cart
-	if not request.session.session_key:
-		request.session.create()
-	session_key = request.session.session_key
-	cart, _ = Cart.objects.get_or_create(session_key=session_key, checked_out=False)
+	else:
+		if not request.session.session_key:
+			request.session.create()
+		cart, _ = Cart.objects.get_or_create(session_key=request.session.session_key, checked_out=False)
+	request._cart = cart
 	return cart
 
 
+# Listings render records from the in-process catalog snapshot (store.catalog)
+# rather than Product instances; searches only ask the database for matching ids.
+def _search_ids(query: str):
+	products = Product.objects.filter(is_active=True).filter(Q(title__icontains=query) | Q(description__icontains=query))
+	return products.values_list('id', flat=True)[:24]
+
+
+def _category_listing(snap, slug: str) -> dict:
+	category = snap.category_by_slug.get(slug)
+	if category is None:
+		raise Http404('No Category matches the given query.')
+	return {'category': category, 'products': snap.products_by_category.get(category.id, ())}
+
+
 def home(request: HttpRequest) -> HttpResponse:
 	query = request.GET.get('q', '').strip()
-	products = Product.objects.filter(is_active=True)
-	if query:
-		products = products.filter(Q(title__icontains=query) | Q(description__icontains=query))
-	categories = Category.objects.filter(is_active=True)
+	snap = catalog.snapshot()
 	return render(request, 'store/home.html', {
-		'products': products.select_related('category')[:24],
-		'categories': categories,
+		'products': snap.records(_search_ids(query)) if query else snap.products[:24],
+		'categories': snap.categories,
 		'query': query,
 	})
 
 
 def category_detail(request: HttpRequest, slug: str) -> HttpResponse:
-	category = get_object_or_404(Category, slug=slug, is_active=True)
-	products = category.products.filter(is_active=True)
-	return render(request, 'store/category_detail.html', {'category': category, 'products': products})
+	return render(request, 'store/category_detail.html', _category_listing(catalog.snapshot(), slug))
 
 
 def product_detail(request: HttpRequest, slug: str) -> HttpResponse:
-	product = get_object_or_404(Product, slug=slug, is_active=True)
+	product = get_object_or_404(inventory.with_available(Product.objects), slug=slug, is_active=True)
 	images = product.images.all()
-	return render(request, 'store/product_detail.html', {'product': product, 'images': images})
+	return render(request, 'store/product_detail.html', {
+		'product': product,
+		'images': images,
+		'recommendations': recommendations_for(product),
+	})
+
+
+# Async variants of the read-heavy catalog views, wired in by settings.STORE_ASYNC_VIEWS.
+# Every lazy relation a template touches is fetched up front, since render() is synchronous.
+async def ahome(request: HttpRequest) -> HttpResponse:
+	query = request.GET.get('q', '').strip()
+	snap = await sync_to_async(catalog.snapshot)()
+	products = snap.records([pk async for pk in _search_ids(query)]) if query else snap.products[:24]
+	await aglobal_context(request)
+	return render(request, 'store/home.html', {'products': products, 'categories': snap.categories, 'query': query})
+
+
+async def acategory_detail(request: HttpRequest, slug: str) -> HttpResponse:
+	context = _category_listing(await sync_to_async(catalog.snapshot)(), slug)
+	await aglobal_context(request)
+	return render(request, 'store/category_detail.html', context)
+
+
+async def aproduct_detail(request: HttpRequest, slug: str) -> HttpResponse:
+	product = await aget_object_or_404(inventory.with_available(Product.objects.select_related('category')), slug=slug, is_active=True)
+	images = [img async for img in product.images.all()]
+	recommendations = await arecommendations_for(product)
+	await aglobal_context(request)
+	return render(request, 'store/product_detail.html', {
+		'product': product,
+		'images': images,
+		'recommendations': recommendations,
+	})
+
+
+def _add_to_cart(cart: Cart, product: Product, quantity: int) -> CartItem:
+	item, created = CartItem.objects.get_or_create(cart=cart, product=product, defaults={'quantity': quantity})
+	if not created:
+		item.quantity += quantity
+		item.save()
+	return item
+
+
+def _set_quantity(item: CartItem, quantity: int) -> bool:
+	"""Set the line quantity, deleting it at zero. Returns True if the line was removed."""
+	if quantity <= 0:
+		item.delete()
+		return True
+	item.quantity = quantity
+	item.save()
+	return False
 
 
 @require_POST
+@rate_limit('add_to_cart')
 def add_to_cart(request: HttpRequest, slug: str) -> HttpResponse:
 	cart = _get_or_create_cart(request)
 	product = get_object_or_404(Product, slug=slug, is_active=True)
-	quantity = int(request.POST.get('quantity', '1'))
-	item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-	if not created:
-		item.quantity += quantity
-	else:
-		item.quantity = quantity
-	item.save()
+	_add_to_cart(cart, product, int(request.POST.get('quantity', '1')))
 	return redirect('cart_detail')
 
 
 def cart_detail(request: HttpRequest) -> HttpResponse:
 	cart = _get_or_create_cart(request)
-	items = cart.items.select_related('product').all()
-	return render(request, 'store/cart.html', {'cart': cart, 'items': items})
+	items = list(cart.items.select_related('product'))
+	total = sum((item.subtotal for item in items), Decimal('0.00'))
+	return render(request, 'store/cart.html', {'cart': cart, 'items': items, 'total': total})
 
 
 @require_POST
+@rate_limit('update_cart_item')
 def update_cart_item(request: HttpRequest, item_id: int) -> HttpResponse:
 	cart = _get_or_create_cart(request)
 	item = get_object_or_404(CartItem, id=item_id, cart=cart)
-	quantity = int(request.POST.get('quantity', '1'))
-	if quantity <= 0:
-		item.delete()
-	else:
-		item.quantity = quantity
-		item.save()
+	_set_quantity(item, int(request.POST.get('quantity', '1')))
 	return redirect('cart_detail')
 
 
+# JSON cart API used by static/js/cart.js. Each call answers with the changed
+# lines, the removed line ids and the cart totals, so the page updates in place
+# without a redirect and a full cart.html render.
+def _parse_quantity(value):
+	try:
+		return int(value)
+	except (TypeError, ValueError):
+		return None
+
+
+def _line_json(item: CartItem) -> dict:
+	return {
+		'id': item.id,
+		'product': item.product.slug,
+		'title': item.product.title,
+		'quantity': item.quantity,
+		'unit_price': str(item.product.discounted_price),
+		'subtotal': str(item.subtotal),
+	}
+
+
+def _cart_json(cart: Cart, changed=(), removed=()) -> JsonResponse:
+	items = list(cart.items.select_related('product'))
+	return JsonResponse({
+		'lines': [_line_json(item) for item in items if item.id in changed],
+		'removed': list(removed),
+		'cart': {
+			'count': len(items),
+			'total': str(sum((item.subtotal for item in items), Decimal('0.00'))),
+		},
+	})
+
+
+def _bad_request(message: str) -> JsonResponse:
+	return JsonResponse({'error': message}, status=400)
+
+
+@require_POST
+@rate_limit('add_to_cart')
+def cart_api_add(request: HttpRequest, slug: str) -> JsonResponse:
+	quantity = _parse_quantity(request.POST.get('quantity', '1'))
+	if quantity is None or quantity < 1:
+		return _bad_request('Quantity must be a positive integer.')
+	cart = _get_or_create_cart(request)
+	product = get_object_or_404(Product, slug=slug, is_active=True)
+	item = _add_to_cart(cart, product, quantity)
+	return _cart_json(cart, changed=[item.id])
+
+
+@require_POST
+@rate_limit('update_cart_item')
+def cart_api_update(request: HttpRequest, item_id: int) -> JsonResponse:
+	quantity = _parse_quantity(request.POST.get('quantity'))
+	if quantity is None or quantity < 0:
+		return _bad_request('Quantity must be zero or a positive integer.')
+	cart = _get_or_create_cart(request)
+	item = get_object_or_404(CartItem, id=item_id, cart=cart)
+	if _set_quantity(item, quantity):
+		return _cart_json(cart, removed=[item_id])
+	return _cart_json(cart, changed=[item_id])
+
+
+@require_POST
+@rate_limit('update_cart_item')
+def cart_api_remove(request: HttpRequest, item_id: int) -> JsonResponse:
+	cart = _get_or_create_cart(request)
+	get_object_or_404(CartItem, id=item_id, cart=cart).delete()
+	return _cart_json(cart, removed=[item_id])
+
+
+@require_POST
+@rate_limit('update_cart_item')
+def cart_api_batch(request: HttpRequest) -> JsonResponse:
+	"""Set several line quantities at once. Body: ``{"lines": [{"id": 1, "quantity": 2}, ...]}``."""
+	try:
+		lines = json.loads(request.body)['lines']
+		quantities = {int(line['id']): int(line['quantity']) for line in lines}
+	except (ValueError, KeyError, TypeError):
+		return _bad_request('Expected {"lines": [{"id": <item id>, "quantity": <n>}, ...]}.')
+	if any(quantity < 0 for quantity in quantities.values()):
+		return _bad_request('Quantities must be zero or positive integers.')
+	cart = _get_or_create_cart(request)
+	items = list(cart.items.filter(id__in=quantities))
+	if len(items) != len(quantities):
+		return _bad_request('Unknown cart item.')
+	removed = [item.id for item in items if quantities[item.id] == 0]
+	changed = [item for item in items if quantities[item.id] > 0]
+	with transaction.atomic():
+		for item in changed:
+			item.quantity = quantities[item.id]
+		CartItem.objects.bulk_update(changed, ['quantity'])
+		CartItem.objects.filter(id__in=removed).delete()
+	return _cart_json(cart, changed={item.id for item in changed}, removed=removed)
+
+
 @login_required
 @require_POST
+@rate_limit('checkout')
 def checkout(request: HttpRequest) -> HttpResponse:
 	cart = _get_or_create_cart(request)
 	items = list(cart.items.select_related('product'))
 	if not items:
 		return redirect('cart_detail')
 	total = sum([i.subtotal for i in items])
+	try:
+		with transaction.atomic():
+			order = _place_order(request, cart, items, total)
+	except inventory.OutOfStock as exc:
+		product = next(item.product for item in items if item.product_id == exc.product_id)
+		return render(request, 'store/cart.html', {
+			'cart': cart,
+			'items': items,
+			'total': total,
+			'error': f'Only {exc.available} of {product.title} left in stock.',
+		}, status=409)
+	# The cart was just checked out, so the header shows an empty one; the next
+	# request creates it rather than this one looking it up again.
+	request._global_context = {'global_categories': catalog.snapshot().categories[:20], 'cart_count': 0}
+	return render(request, 'store/order_success.html', {'order': order})
+
+
+def _place_order(request: HttpRequest, cart: Cart, items: list, total) -> Order:
 	order = Order.objects.create(
 		user=request.user,
 		cart=cart,
@@ -107,13 +294,14 @@ def checkout(request: HttpRequest) -> HttpResponse:
 		postal_code=request.POST.get('postal_code', ''),
 		country=request.POST.get('country', ''),
 	)
-	for item in items:
+	# Stock lives in store.inventory shards; the Product row is not written. Taking it in
+	# product order makes concurrent checkouts lock shared products' shards in the same order.
+	for item in sorted(items, key=lambda i: i.product_id):
+		inventory.take(item.product_id, item.quantity)
 		OrderItem.objects.create(order=order, product=item.product, unit_price=item.product.discounted_price, quantity=item.quantity)
-		item.product.stock = max(0, item.product.stock - item.quantity)
-		item.product.save()
 	cart.checked_out = True
 	cart.save()
-	return render(request, 'store/order_success.html', {'order': order})
+	return order
 
 
 @login_required
@@ -123,7 +311,8 @@ def stripe_checkout(request: HttpRequest) -> HttpResponse:
 	items = list(cart.items.select_related('product'))
 	if not items:
 		return redirect('cart_detail')
-	if stripe and settings.STRIPE_PUBLIC_KEY and settings.STRIPE_SECRET_KEY:
+	stripe = _get_stripe()
+	if stripe:
 		line_items = []
 		for i in items:
 			line_items.append({
@@ -149,6 +338,39 @@ def checkout_success(request: HttpRequest) -> HttpResponse:
 	return render(request, 'store/order_success.html', {'order': None})
 
 
+ORDER_HISTORY_PAGE_SIZE = 10
+
+
+def _parse_order_cursor(cursor: str):
+	created_at, _, order_id = cursor.rpartition('_')
+	try:
+		return parse_datetime(created_at), int(order_id)
+	except (TypeError, ValueError):
+		return None, None
+
+
+@login_required
+def order_list(request: HttpRequest) -> HttpResponse:
+	# Keyset pagination over (created_at, id), newest first, so deep pages cost the same as the first.
+	orders = request.user.orders.order_by('-created_at', '-id').prefetch_related('items__product')
+	created_at, order_id = _parse_order_cursor(request.GET.get('before', ''))
+	if created_at and order_id:
+		orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+	page = list(orders[:ORDER_HISTORY_PAGE_SIZE + 1])
+	next_cursor = None
+	if len(page) > ORDER_HISTORY_PAGE_SIZE:
+		page = page[:ORDER_HISTORY_PAGE_SIZE]
+		last = page[-1]
+		next_cursor = f"{last.created_at.isoformat()}_{last.id}"
+	return render(request, 'store/order_list.html', {'orders': page, 'next_cursor': next_cursor})
+
+
+@login_required
+def order_detail(request: HttpRequest, order_id: int) -> HttpResponse:
+	order = get_object_or_404(Order.objects.prefetch_related('items__product'), id=order_id, user=request.user)
+	return render(request, 'store/order_detail.html', {'order': order})
+
+
 def register_view(request: HttpRequest) -> HttpResponse:
 	if request.method == 'POST':
 		form = UserCreationForm(request.POST)
@@ -178,38 +400,79 @@ def logout_view(request: HttpRequest) -> HttpResponse:
 	return redirect('home')
 
 
-# Simple rule-based product chat restricted to on-site products
-def product_chat_api(request: HttpRequest) -> JsonResponse:
-	if request.method != 'POST':
-		return JsonResponse({'error': 'Method not allowed'}, status=405)
-	payload = request.POST
-	message = (payload.get('message') or '').strip().lower()
-	if not message:
-		return JsonResponse({'reply': 'Hi! How can I help you explore products today?'})
+def typeahead_api(request: HttpRequest) -> JsonResponse:
+	# Served from the in-process index; no database query per keystroke.
+	return JsonResponse({'results': typeahead.search(request.GET.get('q', ''))})
 
+
+# Simple rule-based product chat restricted to on-site products. The reply logic is
+# shared; chat_reply and achat_reply differ only in how they run the stock query.
+def _quick_chat_reply(message: str):
+	"""Reply needing no lookup (empty message or greeting), else None."""
+	if not message:
+		return 'Hi! How can I help you explore products today?'
 	# Very simple intent handling
 	if any(greet in message for greet in ['hello', 'hi', 'hey']):
-		return JsonResponse({'reply': 'Hello! Ask me about products, categories, prices, or availability.'})
+		return 'Hello! Ask me about products, categories, prices, or availability.'
+	return None
+
 
-	# Search products by title keywords
-	keywords = [w for w in message.split() if len(w) > 2]
+def _chat_stock_query(message: str):
+	"""``(id, available)`` of up to five active products matching every keyword of ``message``."""
 	products = Product.objects.filter(is_active=True)
-	for kw in keywords:
+	for kw in [w for w in message.split() if len(w) > 2]:
 		products = products.filter(Q(title__icontains=kw) | Q(description__icontains=kw))
-	products = products.select_related('category')[:5]
-	if products:
+	return inventory.with_available(products).values_list('id', 'available')[:5]
+
+
+def _chat_reply(message: str, available: dict, snap) -> str:
+	# The database only picked the matches and their stock; names and prices come from the catalog snapshot.
+	matches = snap.records(available)
+	if matches:
 		replies = []
-		for p in products:
-			status = 'In stock' if p.in_stock else 'Out of stock'
-			price = p.discounted_price
-			replies.append(f"{p.title} (${price}) - {status} in {p.category.name}.")
-		return JsonResponse({'reply': 'Here are some matches: ' + ' '.join(replies)})
+		for p in matches:
+			status = 'In stock' if available[p.id] > 0 else 'Out of stock'
+			replies.append(f"{p.title} (${p.discounted_price}) - {status} in {p.category.name}.")
+		return 'Here are some matches: ' + ' '.join(replies)
 
 	# Category mention
-	cat = Category.objects.filter(name__icontains=message).first()
+	cat = next((c for c in snap.categories if message in c.name.lower()), None)
 	if cat:
-		count = cat.products.filter(is_active=True).count()
-		return JsonResponse({'reply': f"We have {count} product(s) in {cat.name}. Try searching with keywords."})
+		count = len(snap.products_by_category.get(cat.id, ()))
+		return f"We have {count} product(s) in {cat.name}. Try searching with keywords."
 
 	# Help fallback
-	return JsonResponse({'reply': 'I can help with products, categories, prices, and availability. Try: "phones under 500" or "laptop 16GB".'})
+	return 'I can help with products, categories, prices, and availability. Try: "phones under 500" or "laptop 16GB".'
+
+
+def chat_reply(message: str) -> str:
+	"""Reply of the product assistant to ``message``."""
+	message = (message or '').strip().lower()
+	quick = _quick_chat_reply(message)
+	if quick:
+		return quick
+	return _chat_reply(message, dict(_chat_stock_query(message)), catalog.snapshot())
+
+
+async def achat_reply(message: str) -> str:
+	"""Async counterpart of chat_reply, shared by aproduct_chat_api and the /ws/chat/ consumer."""
+	message = (message or '').strip().lower()
+	quick = _quick_chat_reply(message)
+	if quick:
+		return quick
+	available = {pk: stock async for pk, stock in _chat_stock_query(message)}
+	return _chat_reply(message, available, await sync_to_async(catalog.snapshot)())
+
+
+@rate_limit('chat')
+def product_chat_api(request: HttpRequest) -> JsonResponse:
+	if request.method != 'POST':
+		return JsonResponse({'error': 'Method not allowed'}, status=405)
+	return JsonResponse({'reply': chat_reply(request.POST.get('message'))})
+
+
+@rate_limit('chat')
+async def aproduct_chat_api(request: HttpRequest) -> JsonResponse:
+	if request.method != 'POST':
+		return JsonResponse({'error': 'Method not allowed'}, status=405)
+	return JsonResponse({'reply': await achat_reply(request.POST.get('message'))})
@@ -0,0 +1,66 @@
+"""Boot-time warmup so a fresh worker's first request does not pay one-off costs.
+
+Runs from ``ecommerce.wsgi``/``ecommerce.asgi`` when ``STORE_WARMUP_ON_START`` is
+set, or on demand through ``manage.py warmup``.
+"""
+from pathlib import Path
+
+from django.db import connections
+from django.template import engines
+from django.template.loader import get_template
+from django.template.utils import get_app_template_dirs
+from django.urls import URLResolver, get_resolver, reverse
+
+from . import catalog, typeahead
+
+
+def _template_names():
+	engine = engines['django']
+	dirs = [Path(d) for d in engine.dirs]
+	if engine.app_dirs:
+		dirs += [Path(d) for d in get_app_template_dirs('templates')]
+	names = set()
+	for directory in dirs:
+		names.update(p.name for p in directory.glob('*.html'))
+		names.update(p.relative_to(directory).as_posix() for p in directory.glob('store/**/*.html'))
+	return sorted(names)
+
+
+def compile_templates() -> int:
+	"""Load every storefront template through the (cached) loaders; return how many."""
+	names = _template_names()
+	for name in names:
+		get_template(name)
+	return len(names)
+
+
+def resolve_urls(resolver=None) -> int:
+	"""Compile every URL pattern regex and build the reverse lookup table."""
+	count = 0
+	for pattern in (resolver or get_resolver()).url_patterns:
+		# Reading .regex compiles the pattern and caches it on the pattern object.
+		_ = pattern.pattern.regex
+		if isinstance(pattern, URLResolver):
+			count += resolve_urls(pattern)
+		else:
+			count += 1
+	if resolver is None:
+		reverse('home')
+	return count
+
+
+def prime_catalog() -> None:
+	"""Open the DB connection, load the catalog snapshot and build the typeahead index."""
+	catalog.snapshot()
+	typeahead.index.build()
+	from .views import _get_stripe
+	_get_stripe()
+
+
+def warmup() -> dict:
+	stats = {'templates': compile_templates(), 'urls': resolve_urls()}
+	prime_catalog()
+	# Warmup runs at import time; with a preloading, forking server every worker
+	# would otherwise inherit (and share) this process's DB connection.
+	connections.close_all()
+	return stats